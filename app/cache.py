@@ -0,0 +1,123 @@
+# app/cache.py
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+class AsyncTTLCache:
+    """
+    Cache en mémoire borné, avec expiration par entrée (TTL) et éviction LRU.
+    get_or_fetch dédoublonne les requêtes concurrentes (single-flight) : si plusieurs
+    coroutines manquent la même clé en même temps, une seule requête amont est lancée
+    et toutes attendent son résultat. Les erreurs ne sont pas mises en cache.
+    La requête amont est annulée quand toutes les coroutines qui l'attendent ont été annulées
+    (par exemple quand les clients se sont déconnectés).
+    Les valeurs sont partagées entre les appelants et ne doivent donc pas être modifiées.
+    """
+
+    def __init__(self, max_entries: int = 10000, default_ttl: float = 300.0, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._waiters: Dict[asyncio.Future, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.coalesced = 0
+        self.cancelled = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: Hashable):
+        """Retourne (True, valeur) si la clé est présente et valide, sinon (False, None)."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at <= self._clock():
+            del self._entries[key]
+            self.expirations += 1
+            return False, None
+        self._entries.move_to_end(key)
+        return True, value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Ajoute ou remplace une entrée, en évinçant les moins récemment utilisées au-delà de max_entries."""
+        self._entries[key] = (self._clock() + (self.default_ttl if ttl is None else ttl), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        """Supprime une entrée du cache si elle existe."""
+        self._entries.pop(key, None)
+
+    async def get_or_fetch(self, key: Hashable, fetcher: Callable[[], Awaitable[Any]], ttl: Optional[float] = None):
+        """
+        Retourne la valeur en cache, ou l'obtient via `fetcher` en cas d'absence.
+        La requête amont continue même si l'appelant qui l'a déclenchée est annulé,
+        tant que d'autres coroutines l'attendent encore.
+        """
+        found, value = self.get(key)
+        if found:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await self._wait(key, future)
+
+        future = asyncio.ensure_future(fetcher())
+        self._inflight[key] = future
+
+        def _on_done(done: asyncio.Future):
+            if self._inflight.get(key) is done:
+                del self._inflight[key]
+            if not done.cancelled() and done.exception() is None:
+                self.set(key, done.result(), ttl)
+
+        future.add_done_callback(_on_done)
+        return await self._wait(key, future)
+
+    async def _wait(self, key: Hashable, future: asyncio.Future):
+        """Attend une requête partagée ; le dernier appelant annulé annule la requête amont."""
+        self._waiters[future] = self._waiters.get(future, 0) + 1
+        try:
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            if self._waiters[future] == 1 and not future.done():
+                # Retirée tout de suite : un nouvel appelant relance une requête au lieu d'attendre celle-ci
+                if self._inflight.get(key) is future:
+                    del self._inflight[key]
+                future.cancel()
+                self.cancelled += 1
+            raise
+        finally:
+            self._waiters[future] -= 1
+            if self._waiters[future] == 0:
+                del self._waiters[future]
+
+    def stats(self) -> Dict[str, Any]:
+        """Compteurs du cache (succès, échecs, évictions...) et taux de succès."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "coalesced": self.coalesced,
+            "cancelled": self.cancelled,
+            "inflight": len(self._inflight),
+        }
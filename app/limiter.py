@@ -0,0 +1,140 @@
+# app/limiter.py
+
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Any, Callable, Dict, Optional
+
+# Priorités des appels : les appels interactifs passent avant l'enrichissement en masse
+INTERACTIVE = 0
+BULK = 1
+
+
+class LimiterBusy(Exception):
+    """Levée quand un appel n'a pas obtenu de place dans le délai d'attente autorisé."""
+
+
+class UpstreamLimiter:
+    """
+    Limiteur asynchrone commun à tout le processus pour les appels à une API externe.
+    Deux contraintes s'appliquent à chaque appel :
+    - au plus `max_concurrent` appels en cours en même temps (sémaphore) ;
+    - un seau à jetons (`rate` jetons par seconde, au plus `burst` en réserve) calé sur le quota amont.
+    Les appels en attente sont servis par priorité (INTERACTIVE avant BULK), puis dans l'ordre d'arrivée.
+    Un appel qui attend plus de `max_wait` secondes est abandonné (LimiterBusy) : l'appelant
+    peut alors dégrader sa réponse au lieu d'accumuler du retard.
+    """
+
+    def __init__(self, max_concurrent: int = 32, rate: float = 40.0, burst: int = 40, clock: Callable[[], float] = time.monotonic):
+        self.max_concurrent = max_concurrent
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._tokens = float(burst)
+        self._updated_at = clock()
+        self._active = 0
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.granted = 0
+        self.queued = 0
+        self.shed = 0
+        self.pauses = 0
+
+    def _refill(self):
+        """Ajoute les jetons accumulés depuis la dernière mise à jour."""
+        now = self._clock()
+        self._tokens = min(float(self.burst), self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def _dispatch(self):
+        """Attribue les places libres aux appels en attente, par ordre de priorité."""
+        self._refill()
+        while self._waiters:
+            future = self._waiters[0][2]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if self._active >= self.max_concurrent:
+                return
+            if self._tokens < 1:
+                # Réveil quand le prochain jeton sera disponible
+                if self._timer is None:
+                    delay = (1 - self._tokens) / self.rate
+                    self._timer = asyncio.get_running_loop().call_later(delay, self._on_timer)
+                return
+            heapq.heappop(self._waiters)
+            self._tokens -= 1
+            self._active += 1
+            self.granted += 1
+            future.set_result(None)
+
+    def _on_timer(self):
+        self._timer = None
+        self._dispatch()
+
+    async def acquire(self, priority: int = INTERACTIVE, max_wait: Optional[float] = None):
+        """
+        Attend une place (un jeton et un appel simultané). Lève LimiterBusy si elle n'est pas
+        obtenue en `max_wait` secondes (None : attente illimitée). Chaque acquire doit être
+        suivi d'un release.
+        """
+        self._refill()
+        if not self._waiters and self._active < self.max_concurrent and self._tokens >= 1:
+            self._tokens -= 1
+            self._active += 1
+            self.granted += 1
+            return
+
+        if max_wait is not None and max_wait <= 0:
+            self.shed += 1
+            raise LimiterBusy()
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        self.queued += 1
+        self._dispatch()
+        try:
+            await asyncio.wait_for(future, max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # La place a été attribuée au moment de l'abandon : on la rend
+                self.release()
+            else:
+                future.cancel()
+                self._dispatch()
+            if isinstance(e, asyncio.TimeoutError):
+                self.shed += 1
+                raise LimiterBusy() from None
+            raise
+
+    def release(self):
+        """Libère la place d'un appel terminé."""
+        self._active -= 1
+        self._dispatch()
+
+    def pause(self, seconds: float):
+        """
+        Suspend les appels pendant `seconds` secondes (par exemple après une réponse 429
+        avec Retry-After) : le seau est vidé en avance pour que tous les appelants attendent.
+        """
+        self._refill()
+        self._tokens = min(self._tokens, 1 - seconds * self.rate)
+        self.pauses += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Compteurs du limiteur (appels servis, mis en attente, abandonnés) et état courant."""
+        self._refill()
+        return {
+            "max_concurrent": self.max_concurrent,
+            "rate": self.rate,
+            "burst": self.burst,
+            "active": self._active,
+            "waiting": sum(1 for _, _, future in self._waiters if not future.done()),
+            "tokens": round(self._tokens, 2),
+            "granted": self.granted,
+            "queued": self.queued,
+            "shed": self.shed,
+            "pauses": self.pauses,
+        }
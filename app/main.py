@@ -1,30 +1,49 @@
 # Importations des modules nécessaires
 import os
+import sys
 import asyncio
-from typing import List, Optional, Dict
-from fastapi import FastAPI, HTTPException, status, Request
+import math
+import json
+import logging
+import time
+import unicodedata
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional, Dict
+from fastapi import FastAPI, HTTPException, status, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
-import requests
 import hashlib
-import time
-import httpx # Ajout de la bibliothèque httpx
 from dotenv import load_dotenv
 
+from tmdb_client import TMDB_BASE_URL, TMDBClient
+from cache import AsyncTTLCache
+from metadata_store import MetadataStore
+from limiter import BULK, INTERACTIVE, UpstreamLimiter
+from metrics import (
+    FANOUT_WIDTH, RequestMetricsMiddleware, render_metrics, timed_firestore, update_threadpool_depth
+)
+
 # --- Importations spécifiques à Firebase ---
 import firebase_admin
-from firebase_admin import credentials, firestore
+from firebase_admin import credentials, firestore, firestore_async
 
 # 1. Charger les variables d'environnement
 dotenv_path = os.path.join(os.path.dirname(__file__), '.env')
 load_dotenv(dotenv_path)
 API_KEY = os.getenv("TMDB_API_KEY")
 
+# Journalisation : niveau réglable par LOG_LEVEL (DEBUG pour le détail des retentatives TMDB)
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), format="%(asctime)s %(levelname)s %(name)s : %(message)s")
+logger = logging.getLogger("main")
+# httpx journalise chaque requête au niveau INFO, URL complète (clé API TMDB comprise)
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
 if not API_KEY:
     raise RuntimeError("TMDB_API_KEY non trouvée dans les variables d'environnement.")
 
 # --- Configuration de Firebase ---
-SERVICE_ACCOUNT_KEY_FILE = "mon-app-de-films-firebase-adminsdk-fbsvc-1c4e560702.json"
+SERVICE_ACCOUNT_KEY_FILE = os.getenv("FIREBASE_SERVICE_ACCOUNT_FILE", "mon-app-de-films-firebase-adminsdk-fbsvc-1c4e560702.json")
 
 try:
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -35,18 +54,214 @@ try:
         
     cred = credentials.Certificate(service_account_path)
     firebase_admin.initialize_app(cred)
-    db = firestore.client()
-    print("Firebase Admin SDK initialisé avec succès.")
+    # Client Firestore asynchrone : les lectures et écritures ne bloquent pas la boucle d'événements
+    db = firestore_async.client()
+    logger.info("Firebase Admin SDK initialisé avec succès.")
 except FileNotFoundError as e:
     raise RuntimeError(f"Erreur: {e}")
 except Exception as e:
     raise RuntimeError(f"Erreur d'initialisation de Firebase: {e}. As-tu bien configuré ton fichier de clé de service ?")
 
 
+# Limiteur commun à tous les appels TMDB du processus : appels simultanés plafonnés et
+# seau à jetons calé sur le quota TMDB (environ 40 requêtes par seconde)
+tmdb_limiter = UpstreamLimiter(
+    max_concurrent=int(os.getenv("TMDB_MAX_CONCURRENT", "32")),
+    rate=float(os.getenv("TMDB_RATE_LIMIT", "40")),
+    burst=int(os.getenv("TMDB_RATE_BURST", "40"))
+)
+
+# Priorité de chaque type d'appel : les détails et la recherche passent avant les appels en masse
+TMDB_PRIORITIES = {
+    "details": INTERACTIVE,
+    "search": INTERACTIVE,
+    "popular": INTERACTIVE,
+    "recommendations": BULK,
+    "providers": BULK,
+}
+# Seules les plateformes sont abandonnées après TMDB_BULK_MAX_WAIT secondes d'attente (la carte
+# s'affiche sans elles) ; les listes de candidats attendent jusqu'au délai global du client,
+# car un classement calculé sans elles serait faux
+TMDB_SHEDDABLE_KINDS = {"providers"}
+TMDB_BULK_MAX_WAIT = 2.0
+
+# Client TMDB partagé : un seul pool de connexions keep-alive pour toute la durée de vie de l'API
+tmdb = TMDBClient(API_KEY, base_url=os.getenv("TMDB_BASE_URL", TMDB_BASE_URL), limiter=tmdb_limiter)
+
+def tmdb_get(kind: str, path: str, params: Optional[Dict] = None, max_wait: Optional[float] = None) -> Awaitable[Dict]:
+    """Appel TMDB avec la priorité du type de route (attente bornée pour les appels abandonnables)."""
+    if max_wait is None and kind in TMDB_SHEDDABLE_KINDS:
+        max_wait = TMDB_BULK_MAX_WAIT
+    return tmdb.get_json(path, params, priority=TMDB_PRIORITIES[kind], max_wait=max_wait)
+
+# Cache des réponses TMDB : durée de vie (secondes) par type de route
+TMDB_CACHE_MAX_ENTRIES = 20000
+TMDB_CACHE_TTLS = {
+    "details": 24 * 3600,
+    "providers": 6 * 3600,
+    "recommendations": 12 * 3600,
+    "popular": 3600,
+    "search": 600,
+}
+tmdb_cache = AsyncTTLCache(max_entries=TMDB_CACHE_MAX_ENTRIES)
+
+# Stockage persistant (SQLite) des détails de films et des plateformes FR, partagé par les
+# workers de la machine et conservé entre les redémarrages. Au-delà de la durée de fraîcheur,
+# l'entrée est servie telle quelle pendant qu'une tâche de fond la rafraîchit.
+METADATA_STORE_PATH = os.getenv(
+    "TMDB_METADATA_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "tmdb_metadata.sqlite3")
+)
+METADATA_FRESH_TTLS = {
+    "details": 7 * 24 * 3600,
+    "providers": 24 * 3600,
+}
+metadata_store = MetadataStore(METADATA_STORE_PATH)
+_background_refreshes: Dict[str, asyncio.Task] = {}
+
+def _store_key(path: str, params: Optional[Dict]) -> str:
+    """Clé de stockage d'une requête TMDB : chemin et paramètres triés."""
+    return path + "?" + "&".join(f"{name}={value}" for name, value in sorted((params or {}).items()))
+
+def _trim_payload(kind: str, payload: Dict) -> Dict:
+    """Ne garde que la partie utile d'une réponse TMDB (les plateformes en France)."""
+    if kind == "providers":
+        fr_providers = payload.get("results", {}).get("FR")
+        return {"id": payload.get("id"), "results": {"FR": fr_providers} if fr_providers else {}}
+    return payload
+
+async def _fetch_and_store(kind: str, store_key: str, path: str, params: Optional[Dict], max_wait: Optional[float] = None) -> Dict:
+    """Récupère une ressource sur TMDB et l'enregistre dans le stockage persistant."""
+    payload = _trim_payload(kind, await tmdb_get(kind, path, params, max_wait))
+    await metadata_store.put(store_key, payload)
+    return payload
+
+async def _refresh_in_background(kind: str, cache_key, store_key: str, path: str, params: Optional[Dict]):
+    """Rafraîchit une entrée périmée ; en cas d'échec, l'ancienne valeur reste servie."""
+    try:
+        payload = await _fetch_and_store(kind, store_key, path, params)
+        tmdb_cache.set(cache_key, payload, ttl=TMDB_CACHE_TTLS[kind])
+    except HTTPException:
+        pass
+    finally:
+        _background_refreshes.pop(store_key, None)
+
+async def _fetch_with_store(kind: str, cache_key, path: str, params: Optional[Dict]) -> Dict:
+    """
+    Lecture dans le stockage persistant avant TMDB (stale-while-revalidate) :
+    une entrée périmée est retournée immédiatement et rafraîchie en tâche de fond.
+    """
+    store_key = _store_key(path, params)
+    stored = await metadata_store.get(store_key)
+    if stored is None:
+        return await _fetch_and_store(kind, store_key, path, params)
+
+    payload, age = stored
+    if age > METADATA_FRESH_TTLS[kind] and store_key not in _background_refreshes:
+        _background_refreshes[store_key] = asyncio.create_task(
+            _refresh_in_background(kind, cache_key, store_key, path, params)
+        )
+    return payload
+
+def _cache_key(path: str, params: Optional[Dict]):
+    """Clé du cache en mémoire d'une requête TMDB."""
+    return (path, tuple(sorted((params or {}).items())))
+
+async def tmdb_get_cached(kind: str, path: str, params: Optional[Dict] = None) -> Dict:
+    """
+    Appel TMDB servi par le cache en mémoire (TTL selon `kind`, éviction LRU), puis,
+    pour les détails et les plateformes, par le stockage persistant.
+    Les appels concurrents pour la même ressource partagent une seule requête amont.
+    Le JSON retourné est partagé : il faut le copier avant de le modifier.
+    """
+    key = _cache_key(path, params)
+    if kind in METADATA_FRESH_TTLS:
+        fetcher = lambda: _fetch_with_store(kind, key, path, params)
+    else:
+        fetcher = lambda: tmdb_get(kind, path, params)
+    return await tmdb_cache.get_or_fetch(key, fetcher, ttl=TMDB_CACHE_TTLS[kind])
+
+# Classement des candidats de /recommend : poids de chaque signal dans le score final
+RECOMMEND_RANKING_WEIGHTS = {
+    "frequency": 1.0,   # Part des favoris dont la liste TMDB contient le film
+    "popularity": 0.3,  # Popularité TMDB (échelle logarithmique)
+    "vote": 0.3,        # Note moyenne pondérée par le nombre de votes
+    "local": 0.5,       # Score item-item du moteur local (app/recommender.py)
+}
+VOTE_COUNT_PRIOR = 200  # Nombre de votes à partir duquel la note moyenne compte pour moitié
+RECOMMEND_DEFAULT_LIMIT = 20
+RECOMMEND_MAX_LIMIT = 100
+
+# Le moteur local n'est chargé que si RECOMMEND_LOCAL_SCORER=1 (catalogue local indexé par identifiants TMDB)
+_local_scorer = None
+if os.getenv("RECOMMEND_LOCAL_SCORER") == "1":
+    try:
+        from recommender import score_items as _local_scorer
+    except Exception as e:
+        logger.warning("Moteur de recommandation local indisponible, classement sans score local : %s", e)
+
+def rank_candidates(candidate_lists: List[List[Dict]], favorite_ids: List[int]) -> List[Dict]:
+    """
+    Fusionne les listes de films candidats et les classe par score décroissant : fréquence
+    d'apparition dans les listes, popularité et note TMDB, puis score du moteur local s'il est activé.
+    Les films déjà en favoris sont exclus. Aucun appel réseau n'est fait ici.
+    """
+    excluded = set(favorite_ids)
+    candidates: Dict[int, Dict] = {}
+    frequencies: Dict[int, int] = {}
+    for candidate_list in candidate_lists:
+        for movie in candidate_list:
+            movie_id = movie["id"]
+            if movie_id in excluded:
+                continue
+            candidates.setdefault(movie_id, movie)
+            frequencies[movie_id] = frequencies.get(movie_id, 0) + 1
+
+    if not candidates:
+        return []
+
+    movie_ids = list(candidates.keys())
+    local_scores = [0.0] * len(movie_ids)
+    if _local_scorer is not None and favorite_ids:
+        local_scores = _local_scorer(favorite_ids, movie_ids).tolist()
+    max_local = max(local_scores) or 1.0
+    max_popularity = math.log1p(max(candidates[movie_id].get("popularity") or 0.0 for movie_id in movie_ids)) or 1.0
+    num_lists = max(len(candidate_lists), 1)
+
+    scored = []
+    for movie_id, local_score in zip(movie_ids, local_scores):
+        movie = candidates[movie_id]
+        vote_count = movie.get("vote_count") or 0
+        weighted_vote = (movie.get("vote_average") or 0.0) * vote_count / (vote_count + VOTE_COUNT_PRIOR)
+        score = (
+            RECOMMEND_RANKING_WEIGHTS["frequency"] * frequencies[movie_id] / num_lists
+            + RECOMMEND_RANKING_WEIGHTS["popularity"] * math.log1p(movie.get("popularity") or 0.0) / max_popularity
+            + RECOMMEND_RANKING_WEIGHTS["vote"] * weighted_vote / 10.0
+            + RECOMMEND_RANKING_WEIGHTS["local"] * local_score / max_local
+        )
+        scored.append((-score, movie_id))
+
+    scored.sort()
+    return [candidates[movie_id] for _, movie_id in scored]
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Crée les ressources partagées au démarrage et les libère à l'arrêt."""
+    await tmdb.start()
+    popular_refresher = asyncio.create_task(refresh_popular_movies_periodically())
+    try:
+        yield
+    finally:
+        popular_refresher.cancel()
+        for task in list(_background_refreshes.values()) + list(_recommendation_rebuilds.values()):
+            task.cancel()
+        await tmdb.close()
+
 # Initialisation de l'API FastAPI
 app = FastAPI(
     title="API de Recommandation de Films",
-    description="Une API complète pour la gestion des films, des utilisateurs et des favoris avec Firestore."
+    description="Une API complète pour la gestion des films, des utilisateurs et des favoris avec Firestore.",
+    lifespan=lifespan
 )
 
 # --- ENDPOINT DE BASE ---
@@ -67,8 +282,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Configuration de l'API de TMDB
-TMDB_BASE_URL = "https://api.themoviedb.org/3"
+# Mesure des requêtes et en-tête Server-Timing (middleware ASGI le plus externe)
+app.add_middleware(RequestMetricsMiddleware)
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Métriques au format Prometheus (latences par endpoint, appels TMDB et Firestore, fan-out, moteur local)."""
+    update_threadpool_depth(asyncio.get_running_loop())
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
 
 # Modèles Pydantic pour la validation des données
 class UserCredentials(BaseModel):
@@ -82,6 +304,9 @@ class FavoriteMovie(BaseModel):
     user_id: str
     movie_id: int
 
+class MovieBatchRequest(BaseModel):
+    movie_ids: List[int]
+
 # Fonctions utilitaires
 def hash_password(password: str):
     """Hache le mot de passe pour le stockage sécurisé."""
@@ -91,31 +316,110 @@ def verify_password(stored_password_hash: str, provided_password: str):
     """Vérifie si le mot de passe fourni correspond au hachage stocké."""
     return stored_password_hash == hash_password(provided_password)
 
-def fetch_with_retry(url: str, max_retries: int = 5, delay_seconds: int = 5) -> requests.Response:
-    """Logique de retentative pour les requêtes API."""
-    for attempt in range(max_retries):
-        try:
-            print(f"Tentative {attempt + 1} de {max_retries} pour se connecter à {url}...")
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            print("Requête réussie !")
-            return response
-        except requests.exceptions.RequestException as e:
-            print(f"Erreur de connexion lors de la tentative {attempt + 1}: {e}")
-            if attempt < max_retries - 1:
-                print(f"En attente de {delay_seconds} secondes avant de réessayer...")
-                time.sleep(delay_seconds)
-            else:
-                print("Nombre maximum de retentatives atteint. Abandon.")
-                raise HTTPException(status_code=500, detail=f"Erreur lors de la communication avec l'API TMDB: {e}")
+# Index des comptes par email normalisé (collection `user_emails`, un document par email) :
+# il contient de quoi vérifier une connexion, qui se fait donc en une seule lecture de document.
+def normalize_email(email: str) -> str:
+    """Forme canonique d'un email, utilisée comme identifiant de document dans `user_emails`."""
+    return email.strip().lower()
+
+def _email_index_entry(user_id: str, user_info: Dict) -> Dict:
+    """Contenu d'un document de `user_emails` (copie des champs utiles à la connexion)."""
+    return {
+        "user_id": user_id,
+        "username": user_info.get("username"),
+        "password_hash": user_info.get("password_hash")
+    }
+
+async def find_user_by_email(email: str) -> Optional[Dict]:
+    """
+    Retourne l'entrée d'index (user_id, username, password_hash) d'un email, ou None.
+    Les comptes créés avant l'index sont cherchés dans `users` (email tel que saisi, puis
+    normalisé) puis ajoutés à l'index. Firestore ne compare pas sans tenir compte de la casse :
+    les comptes existants doivent donc être indexés au préalable (backfill_email_index).
+    """
+    email_ref = db.collection("user_emails").document(normalize_email(email))
+    email_doc = await timed_firestore("user_emails.get", email_ref.get())
+    if email_doc.exists:
+        return email_doc.to_dict()
+
+    query_result = None
+    for candidate in dict.fromkeys([email, normalize_email(email)]):
+        query_result = await timed_firestore(
+            "users.query", db.collection("users").where("email", "==", candidate).limit(1).get()
+        )
+        if query_result:
+            break
+    if not query_result:
+        return None
+    entry = _email_index_entry(query_result[0].id, query_result[0].to_dict() or {})
+    await timed_firestore("user_emails.set", email_ref.set(entry))
+    return entry
+
+@firestore.async_transactional
+async def _create_user_transaction(transaction, email_ref, user_ref, favorites_ref, new_user_data: Dict) -> bool:
+    """Crée le compte, ses favoris et son entrée d'index, sauf si l'email est déjà pris."""
+    email_doc = await email_ref.get(transaction=transaction)
+    if email_doc.exists:
+        return False
+    transaction.set(user_ref, new_user_data)
+    transaction.set(favorites_ref, {"favorites": []})
+    transaction.set(email_ref, _email_index_entry(user_ref.id, new_user_data))
+    return True
+
+@firestore.async_transactional
+async def _index_email_transaction(transaction, email_ref, entry: Dict) -> bool:
+    """Ajoute une entrée à l'index des emails, sauf si l'email est déjà indexé."""
+    email_doc = await email_ref.get(transaction=transaction)
+    if email_doc.exists:
+        return False
+    transaction.set(email_ref, entry)
+    return True
+
+async def backfill_email_index() -> Dict:
+    """
+    Indexe dans `user_emails` tous les comptes de `users` qui n'y figurent pas encore, sous leur
+    email normalisé. À lancer avant de servir les inscriptions et connexions par l'index : sinon,
+    un compte existant "Alice@x.com" n'est pas trouvé pour "alice@x.com" et l'email peut être
+    réenregistré. Deux comptes dont les emails ne diffèrent que par la casse sont signalés
+    (le premier indexé est conservé).
+    """
+    async def read_all_users():
+        return [doc async for doc in db.collection("users").stream()]
+    users_docs = await timed_firestore("users.stream", read_all_users())
+
+    counters = {"users": len(users_docs), "added": 0, "already_indexed": 0, "conflicts": 0}
+    for user_doc in users_docs:
+        user_info = user_doc.to_dict() or {}
+        if not user_info.get("email"):
+            continue
+        email_ref = db.collection("user_emails").document(normalize_email(user_info["email"]))
+        added = await timed_firestore(
+            "user_emails.index_transaction",
+            _index_email_transaction(db.transaction(), email_ref, _email_index_entry(user_doc.id, user_info))
+        )
+        if added:
+            counters["added"] += 1
+            continue
+        indexed = await timed_firestore("user_emails.get", email_ref.get())
+        if indexed.to_dict().get("user_id") == user_doc.id:
+            counters["already_indexed"] += 1
+        else:
+            counters["conflicts"] += 1
+            logger.warning("Email %s déjà indexé pour un autre compte que %s", email_ref.id, user_doc.id)
+    return counters
+
+async def get_documents(*doc_refs) -> List:
+    """Lit plusieurs documents Firestore en un seul aller-retour (get_all), dans l'ordre demandé."""
+    async def read_all():
+        return {snapshot.reference.path: snapshot async for snapshot in db.get_all(list(doc_refs))}
+    snapshots = await timed_firestore("get_all", read_all())
+    return [snapshots[doc_ref.path] for doc_ref in doc_refs]
 
 # Fonctions asynchrones pour les appels à TMDB
 async def get_movie_details(movie_id: int):
     """Récupère les détails d'un seul film de manière asynchrone."""
-    tmdb_url = f"{TMDB_BASE_URL}/movie/{movie_id}?api_key={API_KEY}&language=fr-FR"
     try:
-        response = await asyncio.to_thread(fetch_with_retry, tmdb_url)
-        movie_details = response.json()
+        movie_details = await tmdb_get_cached("details", f"/movie/{movie_id}", {"language": "fr-FR"})
         return {
             "id": movie_details.get("id"),
             "title": movie_details.get("title"),
@@ -129,112 +433,399 @@ async def get_watch_providers(movie_id: int) -> Dict:
     """
     Récupère les fournisseurs de streaming (payants et gratuits)
     pour un film et une région donnés.
+    Retourne None si l'appel a été abandonné faute de budget TMDB (voir tmdb_limiter) :
+    le film est alors renvoyé sans ses plateformes.
     """
-    providers_url = f"{TMDB_BASE_URL}/movie/{movie_id}/watch/providers?api_key={API_KEY}"
     try:
-        response = await asyncio.to_thread(fetch_with_retry, providers_url)
-        providers_data = response.json()
-        
-        if "FR" in providers_data.get("results", {}):
-            fr_providers = providers_data["results"]["FR"]
-            return {
-                "link": fr_providers.get("link"),
-                "flatrate": fr_providers.get("flatrate", []),
-                "free": fr_providers.get("free", [])
-            }
-        else:
-            return {"link": None, "flatrate": [], "free": []}
-            
-    except HTTPException:
+        providers_data = await tmdb_get_cached("providers", f"/movie/{movie_id}/watch/providers")
+        return _fr_providers(providers_data)
+    except HTTPException as e:
+        if e.status_code == 503:
+            return None
         return {"link": None, "flatrate": [], "free": []}
 
-async def get_movie_recommendations(movie_id: int):
-    """Récupère les recommandations pour un film donné de manière asynchrone."""
-    recommend_url = f"{TMDB_BASE_URL}/movie/{movie_id}/recommendations?api_key={API_KEY}&language=fr-FR"
+async def get_cached_watch_providers(movie_id: int) -> Optional[Dict]:
+    """
+    Plateformes de streaming d'un film si elles sont déjà connues (cache en mémoire ou
+    stockage persistant), sans aucun appel à TMDB. Retourne None sinon.
+    """
+    path = f"/movie/{movie_id}/watch/providers"
+    found, providers_data = tmdb_cache.get(_cache_key(path, None))
+    if not found:
+        stored = await metadata_store.get(_store_key(path, None))
+        if stored is None:
+            return None
+        providers_data = stored[0]
+    return _fr_providers(providers_data)
+
+def _fr_providers(providers_data: Dict) -> Dict:
+    """Extrait les plateformes en France (abonnement et gratuites) d'une réponse TMDB."""
+    if "FR" in providers_data.get("results", {}):
+        fr_providers = providers_data["results"]["FR"]
+        return {
+            "link": fr_providers.get("link"),
+            "flatrate": fr_providers.get("flatrate", []),
+            "free": fr_providers.get("free", [])
+        }
+    return {"link": None, "flatrate": [], "free": []}
+
+# Requêtes groupées : nombre maximal d'identifiants par appel et de requêtes TMDB simultanées par appel
+BATCH_MAX_IDS = 100
+FANOUT_CONCURRENCY = 16
+
+async def fan_out(fetch: Callable[[int], Awaitable[Any]], movie_ids: List[int], concurrency: int = FANOUT_CONCURRENCY) -> Dict[int, Any]:
+    """
+    Applique `fetch` à chaque film d'une liste : les identifiants en double ne sont traités
+    qu'une fois et au plus `concurrency` appels sont en cours en même temps.
+    Retourne un dictionnaire identifiant -> résultat.
+    """
+    unique_ids = list(dict.fromkeys(movie_ids))
+    FANOUT_WIDTH.labels(fetch.__name__).observe(len(unique_ids))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded_fetch(movie_id: int):
+        async with semaphore:
+            return await fetch(movie_id)
+
+    results = await asyncio.gather(*[bounded_fetch(movie_id) for movie_id in unique_ids])
+    return dict(zip(unique_ids, results))
+
+async def get_movies_with_providers(movie_ids: List[int], with_providers: bool = True) -> List[Dict]:
+    """
+    Détails résumés et plateformes FR de plusieurs films, dans l'ordre des identifiants
+    (sans doublons). Les films introuvables sont ignorés.
+    Avec `with_providers=False`, les plateformes ne sont pas demandées (None).
+    """
+    if with_providers:
+        details, providers = await asyncio.gather(
+            fan_out(get_movie_details, movie_ids),
+            fan_out(get_watch_providers, movie_ids)
+        )
+    else:
+        details, providers = await fan_out(get_movie_details, movie_ids), {}
+    movies = []
+    for movie_id, movie in details.items():
+        if movie:
+            movies.append({**movie, "watch_providers": providers.get(movie_id)})
+    return movies
+
+def parse_movie_ids(movie_ids: List[int]) -> List[int]:
+    """Valide la liste d'identifiants d'une requête groupée (non vide, au plus BATCH_MAX_IDS)."""
+    if not movie_ids:
+        raise HTTPException(status_code=400, detail="Aucun identifiant de film fourni.")
+    if len(movie_ids) > BATCH_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"Au plus {BATCH_MAX_IDS} films par requête.")
+    return movie_ids
+
+def format_movie(movie: Dict, watch_providers: Optional[Dict] = None) -> Dict:
+    """Met en forme un film d'une liste TMDB (recherche, recommandations, populaires) pour le frontend."""
+    return {
+        "id": movie["id"],
+        "title": movie["title"],
+        "overview": movie.get("overview", ""),
+        "poster_path": f"https://image.tmdb.org/t/p/w500{movie['poster_path']}" if movie.get("poster_path") else None,
+        "release_date": movie.get("release_date", "N/A"),
+        "watch_providers": watch_providers
+    }
+
+def _ndjson_event(event: str, **fields) -> str:
+    """Une ligne NDJSON du mode streaming."""
+    return json.dumps({"event": event, **fields}, ensure_ascii=False) + "\n"
+
+async def stream_movie_events(
+    movies: List[Dict],
+    movie_lookups: List[Awaitable[Optional[Dict]]] = (),
+    with_providers: bool = True,
+    **end_fields
+) -> AsyncIterator[str]:
+    """
+    Générateur du mode streaming (NDJSON) : un événement "movie" par film, sans attendre les
+    autres, puis un événement "providers" dès que ses plateformes de streaming sont connues
+    (sauf si le film les contient déjà, ou si `with_providers` vaut False), et enfin un
+    événement "end". Les films de `movies` sont émis immédiatement, dans l'ordre ;
+    ceux de `movie_lookups` (coroutines retournant un film ou None) au fur et à mesure.
+    Si le client se déconnecte, les requêtes encore en cours sont annulées.
+    """
+    pending: Dict[asyncio.Future, Optional[int]] = {}
+    try:
+        for movie in movies:
+            yield _ndjson_event("movie", movie=movie)
+            if with_providers and movie.get("watch_providers") is None:
+                pending[asyncio.ensure_future(get_watch_providers(movie["id"]))] = movie["id"]
+        for lookup in movie_lookups:
+            pending[asyncio.ensure_future(lookup)] = None
+
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                movie_id = pending.pop(task)
+                if movie_id is not None:
+                    yield _ndjson_event("providers", id=movie_id, watch_providers=task.result())
+                    continue
+                movie = task.result()
+                if movie is None:
+                    continue
+                yield _ndjson_event("movie", movie=movie)
+                if with_providers:
+                    pending[asyncio.ensure_future(get_watch_providers(movie["id"]))] = movie["id"]
+
+        yield _ndjson_event("end", **end_fields)
+    finally:
+        for task in pending:
+            task.cancel()
+
+def ndjson_response(events: AsyncIterator[str]) -> StreamingResponse:
+    """Réponse HTTP du mode streaming (une ligne JSON par événement)."""
+    return StreamingResponse(events, media_type="application/x-ndjson")
+
+async def get_movie_recommendations(movie_id: int) -> Optional[List[Dict]]:
+    """Récupère les recommandations pour un film donné de manière asynchrone (None en cas d'échec)."""
     try:
-        response = await asyncio.to_thread(fetch_with_retry, recommend_url)
-        data = response.json()
+        data = await tmdb_get_cached("recommendations", f"/movie/{movie_id}/recommendations", {"language": "fr-FR"})
         return data.get("results", [])
     except HTTPException:
-        return []
+        return None
+
+async def get_ranked_candidates(favorite_ids: List[int]) -> tuple:
+    """
+    Recommandations TMDB de chaque film favori, fusionnées et classées (voir rank_candidates).
+    Retourne (films classés, nombre de listes qui n'ont pas pu être récupérées) : si ce nombre
+    n'est pas nul, le classement est partiel.
+    """
+    FANOUT_WIDTH.labels("get_movie_recommendations").observe(len(favorite_ids))
+    candidate_lists = await asyncio.gather(*[get_movie_recommendations(movie_id) for movie_id in favorite_ids])
+    failed = sum(1 for candidates in candidate_lists if candidates is None)
+    return rank_candidates([candidates or [] for candidates in candidate_lists], favorite_ids), failed
+
+# Recommandations matérialisées : la liste classée et enrichie de chaque utilisateur est stockée
+# dans `user_recommendations/{user_id}` avec la version de ses favoris au moment du calcul.
+# Chaque modification des favoris incrémente cette version et programme une reconstruction en
+# tâche de fond, après RECOMMEND_REBUILD_DELAY secondes sans nouvelle modification.
+# Seule la première page reçoit ses plateformes à la reconstruction (budget TMDB) : celles des
+# pages suivantes sont ajoutées à la lecture, depuis le cache le plus souvent.
+RECOMMEND_MATERIALIZED_SIZE = RECOMMEND_MAX_LIMIT
+RECOMMEND_ENRICHED_SIZE = RECOMMEND_DEFAULT_LIMIT
+RECOMMEND_REBUILD_DELAY = float(os.getenv("RECOMMEND_REBUILD_DELAY", "2.0"))
+_recommendation_rebuilds: Dict[str, asyncio.Task] = {}
+
+def favorites_state(favorites_doc) -> tuple:
+    """Identifiants des films favoris et version du document de favoris (0 si absente)."""
+    if not favorites_doc.exists:
+        return [], 0
+    data = favorites_doc.to_dict() or {}
+    return data.get("favorites", []), data.get("version", 0)
+
+async def rebuild_user_recommendations(user_id: str, delay: float = 0.0):
+    """
+    Recalcule et stocke les recommandations d'un utilisateur (les `RECOMMEND_MATERIALIZED_SIZE`
+    premières, avec les plateformes de la première page) pour la version courante de ses favoris.
+    Si plusieurs workers reconstruisent en même temps, une liste d'une version plus ancienne peut
+    être écrite en dernier : /recommend la détecte à la lecture et recalcule.
+    Un classement partiel (listes de candidats en échec) n'est pas stocké : la version reste
+    périmée et la prochaine lecture recalcule et reprogramme la reconstruction.
+    """
+    try:
+        await asyncio.sleep(delay)
+        favorites_doc = await timed_firestore("user_favorites.get", db.collection("user_favorites").document(user_id).get())
+        favorite_ids, version = favorites_state(favorites_doc)
+        if not favorite_ids:
+            return
+
+        ranked_movies, failed = await get_ranked_candidates(favorite_ids)
+        if failed:
+            logger.warning("Recommandations de %s non stockées : %d liste(s) de candidats sur %d en échec",
+                           user_id, failed, len(favorite_ids))
+            return
+        top_movies = ranked_movies[:RECOMMEND_MATERIALIZED_SIZE]
+        providers = await fan_out(get_watch_providers, [movie["id"] for movie in top_movies[:RECOMMEND_ENRICHED_SIZE]])
+        await timed_firestore("user_recommendations.set", db.collection("user_recommendations").document(user_id).set({
+            "version": version,
+            "total": len(ranked_movies),
+            "recommendations": [format_movie(movie, providers.get(movie["id"])) for movie in top_movies],
+            "updated_at": time.time(),
+        }))
+    except Exception as e:
+        logger.warning("Reconstruction des recommandations de %s échouée : %s", user_id, e)
+    finally:
+        if _recommendation_rebuilds.get(user_id) is asyncio.current_task():
+            del _recommendation_rebuilds[user_id]
+
+def schedule_recommendation_rebuild(user_id: str, delay: float = RECOMMEND_REBUILD_DELAY):
+    """
+    Programme la reconstruction des recommandations d'un utilisateur. Une reconstruction déjà
+    programmée est annulée puis relancée : des modifications rapprochées n'en déclenchent qu'une.
+    """
+    previous = _recommendation_rebuilds.get(user_id)
+    if previous is not None:
+        previous.cancel()
+    _recommendation_rebuilds[user_id] = asyncio.create_task(rebuild_user_recommendations(user_id, delay))
+
+# Films populaires (recommandations des utilisateurs sans favoris) : rafraîchis par une tâche
+# périodique, avec leurs plateformes, et jamais demandés à TMDB pendant une requête
+POPULAR_REFRESH_INTERVAL = TMDB_CACHE_TTLS["popular"]
+POPULAR_RETRY_INTERVAL = 30.0
+POPULAR_READY_TIMEOUT = 5.0
+_popular_movies: List[Dict] = []
+_popular_ready = asyncio.Event()
+
+async def refresh_popular_movies():
+    """Récupère les films populaires, les classe et ajoute leurs plateformes de streaming."""
+    global _popular_movies
+    data = await tmdb_get("popular", "/movie/popular", {"language": "fr-FR"})
+    ranked_movies = rank_candidates([data.get("results", [])], [])
+    providers = await fan_out(get_watch_providers, [movie["id"] for movie in ranked_movies])
+    _popular_movies = [format_movie(movie, providers[movie["id"]]) for movie in ranked_movies]
+    _popular_ready.set()
+
+async def refresh_popular_movies_periodically():
+    """
+    Tâche de fond : rafraîchit les films populaires toutes les POPULAR_REFRESH_INTERVAL secondes.
+    Une erreur est journalisée et le rafraîchissement retenté : la tâche ne s'arrête qu'à l'arrêt de l'API.
+    """
+    while True:
+        try:
+            await refresh_popular_movies()
+            await asyncio.sleep(POPULAR_REFRESH_INTERVAL)
+        except HTTPException as e:
+            logger.warning("Rafraîchissement des films populaires échoué : %s", e.detail)
+            await asyncio.sleep(POPULAR_RETRY_INTERVAL)
+        except Exception:
+            logger.exception("Erreur inattendue lors du rafraîchissement des films populaires")
+            await asyncio.sleep(POPULAR_RETRY_INTERVAL)
+
+async def get_popular_movies() -> List[Dict]:
+    """Films populaires déjà chargés ; au démarrage, attend le premier rafraîchissement (503 au-delà)."""
+    if not _popular_ready.is_set():
+        try:
+            await asyncio.wait_for(_popular_ready.wait(), timeout=POPULAR_READY_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=503, detail="Films populaires pas encore disponibles, réessayez plus tard.")
+    return _popular_movies
 
 # --- Endpoints de l'API ---
 
 @app.post("/register", status_code=status.HTTP_201_CREATED)
 async def register(user_data: UserRegistration):
-    """Enregistre un nouvel utilisateur dans la collection `users` de Firestore."""
-    users_ref = db.collection("users")
-    query_result = users_ref.where("email", "==", user_data.email).limit(1).get()
-
-    if query_result:
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail="Cet email est déjà enregistré."
-        )
+    """
+    Enregistre un nouvel utilisateur dans la collection `users` de Firestore.
+    Le compte, ses favoris et son entrée dans l'index des emails sont créés dans une transaction.
+    """
+    email_already_used = HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="Cet email est déjà enregistré."
+    )
+    if await find_user_by_email(user_data.email) is not None:
+        raise email_already_used
 
     new_user_data = {
         "username": user_data.username,
         "email": user_data.email,
         "password_hash": hash_password(user_data.password)
     }
-    user_doc_ref = users_ref.document()
-    user_doc_ref.set(new_user_data)
-    
+    user_doc_ref = db.collection("users").document()
     favorites_ref = db.collection("user_favorites").document(user_doc_ref.id)
-    favorites_ref.set({"favorites": []})
+    email_ref = db.collection("user_emails").document(normalize_email(user_data.email))
+
+    created = await timed_firestore(
+        "users.create_transaction",
+        _create_user_transaction(db.transaction(), email_ref, user_doc_ref, favorites_ref, new_user_data)
+    )
+    if not created:
+        raise email_already_used
 
     return {"user_id": user_doc_ref.id, "username": user_data.username}
 
 @app.post("/login")
 async def login(credentials: UserCredentials):
-    """Connecte un utilisateur en vérifiant ses identifiants dans Firestore."""
-    users_ref = db.collection("users")
-    query_result = users_ref.where("email", "==", credentials.email).limit(1).get()
+    """
+    Connecte un utilisateur en vérifiant ses identifiants dans Firestore
+    (une seule lecture dans l'index des emails).
+    """
+    user_info = await find_user_by_email(credentials.email)
 
-    if not query_result:
+    if not user_info:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Email ou mot de passe incorrect."
         )
 
-    user_doc = query_result[0]
-    user_info = user_doc.to_dict()
-
-    if user_info and verify_password(user_info["password_hash"], credentials.password):
-        return {"user_id": user_doc.id, "username": user_info["username"]}
+    if user_info.get("password_hash") and verify_password(user_info["password_hash"], credentials.password):
+        return {"user_id": user_info["user_id"], "username": user_info["username"]}
 
     raise HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Email ou mot de passe incorrect."
     )
 
+def normalize_query(query: str) -> str:
+    """
+    Forme canonique d'une recherche (Unicode NFC, sans casse, espaces réduits) : les saisies
+    équivalentes ("Inception ", "inception") partagent la même entrée de cache et la même requête TMDB.
+    """
+    return " ".join(unicodedata.normalize("NFC", query).casefold().split())
+
+# Intervalle (secondes) de vérification de la connexion du client pendant une requête
+CLIENT_DISCONNECT_POLL_INTERVAL = 0.1
+
+async def cancel_on_disconnect(request: Request, work: Awaitable):
+    """
+    Exécute `work` en surveillant la connexion du client. S'il se déconnecte (recherche
+    remplacée par la frappe suivante), le travail est annulé, ainsi que les requêtes TMDB
+    qu'il était seul à attendre (voir AsyncTTLCache.get_or_fetch).
+    """
+    task = asyncio.ensure_future(work)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=CLIENT_DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                return Response(status_code=499)
+    finally:
+        task.cancel()
+
 @app.get("/search/{query}")
-async def search_movies(query: str):
+async def search_movies(
+    query: str,
+    request: Request,
+    stream: bool = False,
+    providers: str = Query("all", pattern="^(all|cached|none)$")
+):
     """
     Recherche des films via l'API TMDB et y ajoute les plateformes de streaming
     disponibles en France.
+    Avec `?stream=1`, les résultats sont envoyés en NDJSON dès la réponse de la recherche,
+    puis les plateformes film par film (voir stream_movie_events).
+    Avec `?providers=cached`, les résultats sont retournés dès la réponse de la recherche, avec
+    les plateformes déjà en cache (None sinon, à demander ensuite via /watch_providers?ids=...).
+    Avec `?providers=none`, les plateformes ne sont pas demandées du tout.
+    Le travail en cours est annulé si le client se déconnecte.
     """
-    search_url = f"{TMDB_BASE_URL}/search/movie?api_key={API_KEY}&query={query}&language=fr-FR"
+    return await cancel_on_disconnect(request, _search_movies(normalize_query(query), stream, providers))
+
+async def _search_movies(query: str, stream: bool, providers_mode: str):
+    """Recherche TMDB et enrichissement des résultats (voir search_movies)."""
     try:
-        response = await asyncio.to_thread(fetch_with_retry, search_url)
-        data = response.json()
-        
+        data = await tmdb_get_cached("search", "/search/movie", {"query": query, "language": "fr-FR"})
+
+        if stream:
+            return ndjson_response(stream_movie_events(
+                [format_movie(movie) for movie in data.get("results", [])], with_providers=providers_mode != "none"
+            ))
+
         movie_ids = [movie["id"] for movie in data.get("results", [])]
-        watch_provider_tasks = [get_watch_providers(movie_id) for movie_id in movie_ids]
-        providers_results = await asyncio.gather(*watch_provider_tasks)
-        
+        if providers_mode == "none":
+            providers = {}
+        elif providers_mode == "cached":
+            providers = await fan_out(get_cached_watch_providers, movie_ids)
+        else:
+            providers = await fan_out(get_watch_providers, movie_ids)
+
         results = []
-        for i, movie in enumerate(data.get("results", [])):
-            movie_details = {
-                "id": movie["id"],
-                "title": movie["title"],
-                "overview": movie.get("overview", ""),
-                "poster_path": f"https://image.tmdb.org/t/p/w500{movie['poster_path']}" if movie.get("poster_path") else None,
-                "release_date": movie.get("release_date", "N/A"),
-                "watch_providers": providers_results[i]
-            }
-            results.append(movie_details)
-        
+        for movie in data.get("results", []):
+            results.append(format_movie(movie, providers.get(movie["id"])))
+
         return {"results": results}
     except HTTPException as e:
         raise e
@@ -248,98 +839,103 @@ async def get_movie_with_details(movie_id: int):
     Récupère les détails d'un film, y compris les plateformes de streaming,
     et les recommandations.
     """
-    async with httpx.AsyncClient() as client:
-        # Requête pour les détails du film
-        movie_details_url = f"{TMDB_BASE_URL}/movie/{movie_id}?api_key={API_KEY}&language=fr-FR"
-        try:
-            movie_response = await client.get(movie_details_url)
-            movie_response.raise_for_status()
-            movie_details = movie_response.json()
-        except httpx.HTTPStatusError as e:
-            if e.response.status_code == 404:
-                raise HTTPException(status_code=404, detail="Film non trouvé, bro.")
-            raise HTTPException(status_code=e.response.status_code, detail=f"Erreur de l'API TMDb : {e}")
-
-        # Requête pour les plateformes de streaming
-        providers_url = f"{TMDB_BASE_URL}/movie/{movie_id}/watch/providers?api_key={API_KEY}"
-        try:
-            providers_response = await client.get(providers_url)
-            providers_response.raise_for_status()
-            providers_data = providers_response.json()
-            providers_france = providers_data.get('results', {}).get('FR')
-            movie_details['watch_providers'] = providers_france
-        except httpx.HTTPStatusError:
-            movie_details['watch_providers'] = None
-        
-        return movie_details
+    # Détails du film et plateformes de streaming récupérés en parallèle sur le client partagé
+    details_result, providers_result = await asyncio.gather(
+        tmdb_get_cached("details", f"/movie/{movie_id}", {"language": "fr-FR"}),
+        tmdb_get_cached("providers", f"/movie/{movie_id}/watch/providers"),
+        return_exceptions=True
+    )
+
+    if isinstance(details_result, HTTPException):
+        if details_result.status_code == 404:
+            raise HTTPException(status_code=404, detail="Film non trouvé, bro.")
+        raise HTTPException(status_code=details_result.status_code, detail=f"Erreur de l'API TMDb : {details_result.detail}")
+    if isinstance(details_result, BaseException):
+        raise details_result
+    movie_details = dict(details_result) # Copie : le JSON en cache est partagé
+
+    if isinstance(providers_result, BaseException):
+        movie_details['watch_providers'] = None
+    else:
+        movie_details['watch_providers'] = providers_result.get('results', {}).get('FR')
+
+    return movie_details
 
 
 @app.post("/favorites")
 async def manage_favorites(favorite_data: FavoriteMovie):
     """
     Ajoute ou retire un film des favoris de l'utilisateur dans Firestore.
-    Utilise une transaction pour garantir l'atomicité.
+    Utilise une transaction pour garantir l'atomicité ; la version des favoris est incrémentée
+    et la reconstruction des recommandations matérialisées est programmée en tâche de fond.
     """
     user_id = favorite_data.user_id
     movie_id = favorite_data.movie_id
     favorites_doc_ref = db.collection("user_favorites").document(user_id)
 
-    @firestore.transactional
-    def update_favorites_transaction(transaction, doc_ref):
-        favorites_doc = doc_ref.get(transaction=transaction)
+    @firestore.async_transactional
+    async def update_favorites_transaction(transaction, doc_ref):
+        favorites_doc = await doc_ref.get(transaction=transaction)
         if not favorites_doc.exists:
-            transaction.set(doc_ref, {"favorites": [movie_id]})
+            transaction.set(doc_ref, {"favorites": [movie_id], "version": 1})
             return {"status": "ajouté", "movie_id": movie_id, "user_id": user_id}
 
-        current_favorites = favorites_doc.to_dict().get("favorites", [])
+        current_favorites, version = favorites_state(favorites_doc)
         if movie_id in current_favorites:
             current_favorites.remove(movie_id)
-            transaction.update(doc_ref, {"favorites": current_favorites})
+            transaction.update(doc_ref, {"favorites": current_favorites, "version": version + 1})
             return {"status": "retiré", "movie_id": movie_id, "user_id": user_id}
         else:
             current_favorites.append(movie_id)
-            transaction.update(doc_ref, {"favorites": current_favorites})
+            transaction.update(doc_ref, {"favorites": current_favorites, "version": version + 1})
             return {"status": "ajouté", "movie_id": movie_id, "user_id": user_id}
 
     transaction = db.transaction()
     try:
-        result = await asyncio.to_thread(update_favorites_transaction, transaction, favorites_doc_ref)
-        return result
+        result = await timed_firestore("user_favorites.transaction", update_favorites_transaction(transaction, favorites_doc_ref))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur de transaction Firestore : {e}")
+    schedule_recommendation_rebuild(user_id)
+    return result
 
 
 @app.get("/favorites/{user_id}")
-async def get_favorites(user_id: str):
+async def get_favorites(
+    user_id: str,
+    stream: bool = False,
+    providers: str = Query("all", pattern="^(all|none)$")
+):
     """
     Récupère la liste des films favoris d'un utilisateur depuis Firestore,
     puis récupère les détails de chaque film via l'API TMDB de manière concurrente.
+    Avec `?stream=1`, chaque film est envoyé en NDJSON dès que ses détails sont connus.
+    Avec `?providers=none`, les plateformes de streaming ne sont pas demandées.
     """
     favorites_doc_ref = db.collection("user_favorites").document(user_id)
-    favorites_doc = await asyncio.to_thread(favorites_doc_ref.get)
+    favorites_doc = await timed_firestore("user_favorites.get", favorites_doc_ref.get())
+    favorite_ids = favorites_doc.to_dict().get("favorites", []) if favorites_doc.exists else []
+
+    if stream:
+        return ndjson_response(stream_movie_events(
+            [], [get_movie_details(movie_id) for movie_id in favorite_ids], with_providers=providers == "all"
+        ))
 
     if not favorites_doc.exists:
         return {"favorites": []}
 
-    favorite_ids = favorites_doc.to_dict().get("favorites", [])
-    
-    tasks = [get_movie_details(movie_id) for movie_id in favorite_ids]
-    favorite_movies_data = [movie for movie in await asyncio.gather(*tasks) if movie]
-
-    providers_tasks = [get_watch_providers(movie["id"]) for movie in favorite_movies_data]
-    providers_results = await asyncio.gather(*providers_tasks)
-    
-    for i, movie in enumerate(favorite_movies_data):
-        movie["watch_providers"] = providers_results[i]
-
-    return {"favorites": favorite_movies_data}
+    return {"favorites": await get_movies_with_providers(favorite_ids, with_providers=providers == "all")}
 
 
 @app.get("/profile/{user_id}")
 async def get_user_profile(user_id: str):
-    """Récupère le profil d'un utilisateur depuis Firestore en utilisant son ID."""
-    user_doc_ref = db.collection("users").document(user_id)
-    user_doc = await asyncio.to_thread(user_doc_ref.get)
+    """
+    Récupère le profil d'un utilisateur depuis Firestore en utilisant son ID, avec les
+    identifiants de ses films favoris (les deux documents sont lus en un seul get_all).
+    """
+    user_doc, favorites_doc = await get_documents(
+        db.collection("users").document(user_id),
+        db.collection("user_favorites").document(user_id)
+    )
     
     if not user_doc.exists:
         raise HTTPException(status_code=404, detail="Utilisateur non trouvé.")
@@ -348,57 +944,91 @@ async def get_user_profile(user_id: str):
     return {
         "user_id": user_doc.id,
         "username": user_data.get("username"),
-        "email": user_data.get("email")
+        "email": user_data.get("email"),
+        "favorite_ids": favorites_doc.to_dict().get("favorites", []) if favorites_doc.exists else []
     }
 
 @app.get("/recommend/{user_id}")
-async def get_recommendations(user_id: str):
+async def get_recommendations(
+    user_id: str,
+    limit: int = Query(RECOMMEND_DEFAULT_LIMIT, ge=1, le=RECOMMEND_MAX_LIMIT),
+    offset: int = Query(0, ge=0),
+    stream: bool = False,
+    providers: str = Query("all", pattern="^(all|none)$")
+):
     """
     Recommande des films en fonction des favoris de l'utilisateur stockés dans Firestore
     ou des films populaires si l'utilisateur n'a pas de favoris.
+    Les favoris et les recommandations matérialisées sont lus en un seul get_all : si la liste
+    stockée correspond à la version courante des favoris, la page est servie telle quelle.
+    Sinon, les candidats sont classés avant tout enrichissement (seuls les films de la page
+    demandée reçoivent leurs plateformes) et une reconstruction est programmée.
+    Les films populaires viennent de la liste rafraîchie périodiquement (refresh_popular_movies).
+    Avec `?stream=1`, la page est envoyée en NDJSON dans l'ordre du classement, puis les
+    plateformes manquantes film par film (voir stream_movie_events).
+    Avec `?providers=none`, les plateformes manquantes ne sont pas demandées.
+    `partial` vaut True si des listes de candidats n'ont pas pu être récupérées (classement incomplet).
     """
-    favorites_doc_ref = db.collection("user_favorites").document(user_id)
-    favorites_doc = await asyncio.to_thread(favorites_doc_ref.get)
-    favorite_ids = favorites_doc.to_dict().get("favorites", []) if favorites_doc.exists else []
-    
-    recommended_movies_data = {}
+    favorites_doc, stored_doc = await get_documents(
+        db.collection("user_favorites").document(user_id),
+        db.collection("user_recommendations").document(user_id)
+    )
+    favorite_ids, version = favorites_state(favorites_doc)
+    stored = stored_doc.to_dict() if stored_doc.exists else None
+    failed = 0
 
     if not favorite_ids:
-        popular_url = f"{TMDB_BASE_URL}/movie/popular?api_key={API_KEY}&language=fr-FR"
-        try:
-            response = await asyncio.to_thread(fetch_with_retry, popular_url)
-            data = response.json()
-            for movie in data.get("results", []):
-                recommended_movies_data[movie["id"]] = movie
-        except HTTPException as e:
-            raise e
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Erreur de l'API TMDB: {e}")
+        popular_movies = await get_popular_movies()
+        page, total = popular_movies[offset:offset + limit], len(popular_movies)
+    elif (
+        stored is not None and stored.get("version") == version
+        and (offset + limit <= len(stored["recommendations"]) or stored["total"] <= len(stored["recommendations"]))
+    ):
+        page, total = stored["recommendations"][offset:offset + limit], stored["total"]
     else:
-        tasks = [get_movie_recommendations(movie_id) for movie_id in favorite_ids]
-        recommendation_lists = await asyncio.gather(*tasks)
-        
-        for rec_list in recommendation_lists:
-            for movie in rec_list:
-                recommended_movies_data[movie["id"]] = movie
-    
-    movie_ids = list(recommended_movies_data.keys())
-    providers_tasks = [get_watch_providers(movie_id) for movie_id in movie_ids]
-    providers_results = await asyncio.gather(*providers_tasks)
-    
+        if user_id not in _recommendation_rebuilds and (stored is None or stored.get("version") != version):
+            schedule_recommendation_rebuild(user_id, delay=0.0)
+        ranked_movies, failed = await get_ranked_candidates(favorite_ids)
+        page, total = [format_movie(movie) for movie in ranked_movies[offset:offset + limit]], len(ranked_movies)
+
+    if stream:
+        return ndjson_response(stream_movie_events(
+            page, with_providers=providers == "all", total=total, limit=limit, offset=offset, partial=failed > 0
+        ))
+
+    missing_ids = [movie["id"] for movie in page if movie.get("watch_providers") is None] if providers == "all" else []
+    page_providers = await fan_out(get_watch_providers, missing_ids) if missing_ids else {}
+
     results = []
-    for i, movie_id in enumerate(movie_ids):
-        movie = recommended_movies_data[movie_id]
-        results.append({
-            "id": movie["id"],
-            "title": movie["title"],
-            "overview": movie.get("overview", ""),
-            "poster_path": f"https://image.tmdb.org/t/p/w500{movie['poster_path']}" if movie.get("poster_path") else None,
-            "release_date": movie.get("release_date", "N/A"),
-            "watch_providers": providers_results[i]
-        })
-    
-    return {"recommendations": results}
+    for movie in page:
+        if movie["id"] in page_providers:
+            movie = {**movie, "watch_providers": page_providers[movie["id"]]}
+        results.append(movie)
+
+    return {"recommendations": results, "total": total, "limit": limit, "offset": offset, "partial": failed > 0}
+
+@app.post("/movies/batch")
+async def get_movies_batch(batch: MovieBatchRequest):
+    """
+    Détails et plateformes de streaming en France de plusieurs films en une seule requête.
+    Les films introuvables sont listés dans `not_found`.
+    """
+    movies = await get_movies_with_providers(parse_movie_ids(batch.movie_ids))
+    found_ids = {movie["id"] for movie in movies}
+    return {
+        "movies": movies,
+        "not_found": [movie_id for movie_id in dict.fromkeys(batch.movie_ids) if movie_id not in found_ids]
+    }
+
+@app.get("/watch_providers")
+async def get_providers_batch(ids: str = Query(..., description="Identifiants TMDB séparés par des virgules")):
+    """Plateformes de streaming en France de plusieurs films (`?ids=550,680,13`)."""
+    try:
+        movie_ids = [int(movie_id) for movie_id in ids.split(",") if movie_id.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Les identifiants de films doivent être des entiers.")
+    providers = await fan_out(get_watch_providers, parse_movie_ids(movie_ids))
+    return {"watch_providers": {str(movie_id): movie_providers for movie_id, movie_providers in providers.items()}}
 
 @app.get("/watch_providers/{movie_id}")
 async def get_providers_for_movie(movie_id: int):
@@ -409,8 +1039,75 @@ async def get_providers_for_movie(movie_id: int):
     providers = await get_watch_providers(movie_id)
     return {"watch_providers": providers}
 
+@app.get("/cache/stats")
+async def get_cache_stats():
+    """Compteurs du cache TMDB en mémoire et état du stockage persistant."""
+    return {
+        **tmdb_cache.stats(),
+        "tmdb_limiter": tmdb_limiter.stats(),
+        "persistent_store": await asyncio.to_thread(metadata_store.stats),
+        "background_refreshes": len(_background_refreshes),
+        "recommendation_rebuilds": len(_recommendation_rebuilds),
+        "popular_movies": len(_popular_movies),
+    }
+
+
+TMDB_WARM_UP_MAX_WAIT = 3600.0
+
+async def warm_up_metadata_store(concurrency: int = 8) -> Dict:
+    """
+    Pré-remplit le stockage persistant avec les détails et les plateformes de tous les films
+    présents dans les favoris des utilisateurs. Les entrées absentes ou périmées sont récupérées
+    sur TMDB, avec au plus `concurrency` films traités en parallèle ; les appels attendent leur
+    tour auprès du limiteur sans être abandonnés.
+    """
+    async def read_all_favorites():
+        return [doc async for doc in db.collection("user_favorites").stream()]
+    favorites_docs = await timed_firestore("user_favorites.stream", read_all_favorites())
+    movie_ids = sorted({movie_id for doc in favorites_docs for movie_id in (doc.to_dict() or {}).get("favorites", [])})
+
+    semaphore = asyncio.Semaphore(concurrency)
+    counters = {"movies": len(movie_ids), "fetched": 0, "already_fresh": 0, "errors": 0}
+
+    async def warm_up(kind: str, path: str, params: Optional[Dict]):
+        store_key = _store_key(path, params)
+        stored = await metadata_store.get(store_key)
+        if stored is not None and stored[1] <= METADATA_FRESH_TTLS[kind]:
+            counters["already_fresh"] += 1
+            return
+        try:
+            await _fetch_and_store(kind, store_key, path, params, max_wait=TMDB_WARM_UP_MAX_WAIT)
+            counters["fetched"] += 1
+        except HTTPException:
+            counters["errors"] += 1
+
+    async def warm_up_movie(movie_id: int):
+        async with semaphore:
+            await asyncio.gather(
+                warm_up("details", f"/movie/{movie_id}", {"language": "fr-FR"}),
+                warm_up("providers", f"/movie/{movie_id}/watch/providers", None)
+            )
+
+    await asyncio.gather(*[warm_up_movie(movie_id) for movie_id in movie_ids])
+    return counters
+
+async def _warm_up_cli():
+    """Lance le pré-remplissage du stockage persistant en dehors du serveur."""
+    await tmdb.start()
+    try:
+        logger.info("Pré-remplissage terminé : %s", await warm_up_metadata_store())
+    finally:
+        await tmdb.close()
+
 
 # Point d'entrée pour lancer l'application avec uvicorn
+# (python main.py --warm-up pour pré-remplir le stockage persistant des métadonnées TMDB,
+#  python main.py --backfill-email-index pour indexer les comptes existants par email)
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
+    if "--warm-up" in sys.argv:
+        asyncio.run(_warm_up_cli())
+    elif "--backfill-email-index" in sys.argv:
+        logger.info("Indexation des emails terminée : %s", asyncio.run(backfill_email_index()))
+    else:
+        import uvicorn
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,75 @@
+# app/metadata_store.py
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+
+class MetadataStore:
+    """
+    Stockage persistant local (SQLite) des réponses TMDB, partagé par tous les workers d'une
+    même machine et conservé entre les redémarrages. La base est en mode WAL : les lectures
+    des différents processus ne bloquent pas les écritures.
+    Chaque entrée garde sa date de récupération pour que l'appelant décide si elle est périmée ;
+    les entrées ne sont jamais supprimées, une donnée périmée restant servie pendant son rafraîchissement.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = self._connection()
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS tmdb_payloads ("
+            "key TEXT PRIMARY KEY, payload TEXT NOT NULL, fetched_at REAL NOT NULL)"
+        )
+        connection.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        """Connexion SQLite propre au thread courant."""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5.0)
+            connection.execute("PRAGMA busy_timeout=5000")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get_sync(self, key: str) -> Optional[Tuple[Any, float]]:
+        """Retourne (payload, âge en secondes) pour une clé, ou None si elle est absente."""
+        row = self._connection().execute(
+            "SELECT payload, fetched_at FROM tmdb_payloads WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), time.time() - row[1]
+
+    def put_many_sync(self, items: Iterable[Tuple[str, Any]]):
+        """Enregistre (ou remplace) plusieurs entrées dans une seule transaction."""
+        now = time.time()
+        connection = self._connection()
+        with connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO tmdb_payloads (key, payload, fetched_at) VALUES (?, ?, ?)",
+                [(key, json.dumps(payload, ensure_ascii=False), now) for key, payload in items]
+            )
+
+    async def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        """Version asynchrone de get_sync (exécutée dans un thread)."""
+        return await asyncio.to_thread(self.get_sync, key)
+
+    async def put(self, key: str, payload: Any):
+        """Enregistre une entrée (exécuté dans un thread)."""
+        await asyncio.to_thread(self.put_many_sync, [(key, payload)])
+
+    def stats(self) -> Dict[str, Any]:
+        """Nombre d'entrées et taille du fichier de la base."""
+        count = self._connection().execute("SELECT COUNT(*) FROM tmdb_payloads").fetchone()[0]
+        return {"path": self.path, "entries": count, "size_bytes": os.path.getsize(self.path) if os.path.exists(self.path) else 0}
@@ -0,0 +1,173 @@
+# app/metrics.py
+
+import asyncio
+import os
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Awaitable, Dict, Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+
+# Tranches des histogrammes de latence (secondes)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+FANOUT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "api_request_duration_seconds", "Durée de traitement des requêtes HTTP de l'API (jusqu'à l'envoi des en-têtes).",
+    ["method", "route", "status"], buckets=LATENCY_BUCKETS
+)
+UPSTREAM_CALLS = Counter(
+    "upstream_calls_total", "Appels aux services externes, par résultat (ok, http_4xx, http_5xx, transport_error...).",
+    ["service", "operation", "outcome"]
+)
+UPSTREAM_DURATION = Histogram(
+    "upstream_call_duration_seconds", "Durée des appels aux services externes (une tentative).",
+    ["service", "operation"], buckets=LATENCY_BUCKETS
+)
+UPSTREAM_RETRIES = Counter(
+    "upstream_retries_total", "Nouvelles tentatives après une erreur transitoire.", ["service", "operation"]
+)
+FANOUT_WIDTH = Histogram(
+    "fanout_width", "Nombre d'appels lancés en parallèle par une requête (après dédoublonnage).",
+    ["operation"], buckets=FANOUT_BUCKETS
+)
+THREADPOOL_QUEUE_DEPTH = Gauge(
+    "threadpool_queue_depth", "Tâches en attente dans l'exécuteur par défaut (asyncio.to_thread).", multiprocess_mode="livesum"
+)
+RECOMMENDER_BUILD_DURATION = Histogram(
+    "recommender_build_duration_seconds", "Durée de construction des éléments du modèle de recommandation.",
+    ["stage"], buckets=LATENCY_BUCKETS + (60.0, 300.0, 1800.0)
+)
+RECOMMENDER_SCORE_DURATION = Histogram(
+    "recommender_score_duration_seconds", "Durée de calcul des recommandations, par moteur.",
+    ["engine"], buckets=LATENCY_BUCKETS
+)
+
+# Détail des temps de la requête en cours pour l'en-tête Server-Timing (None si désactivé)
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING", "0") == "1"
+_request_timings: ContextVar[Optional[Dict[str, list]]] = ContextVar("request_timings", default=None)
+
+_NUMERIC_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+
+def route_template(path: str) -> str:
+    """Remplace les identifiants numériques d'un chemin ("/movie/550" -> "/movie/{id}") pour borner les labels."""
+    return _NUMERIC_SEGMENT.sub("/{id}", path)
+
+
+def record_timing(name: str, seconds: float):
+    """Ajoute une durée au détail Server-Timing de la requête en cours (si activé)."""
+    timings = _request_timings.get()
+    if timings is not None:
+        entry = timings.setdefault(name, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+
+def observe_upstream(service: str, operation: str, outcome: str, seconds: float):
+    """Enregistre un appel à un service externe (compteur, histogramme et Server-Timing)."""
+    UPSTREAM_CALLS.labels(service, operation, outcome).inc()
+    UPSTREAM_DURATION.labels(service, operation).observe(seconds)
+    record_timing(service, seconds)
+
+
+async def timed_firestore(operation: str, call: Awaitable):
+    """Attend un appel Firestore en le mesurant (`operation` : "collection.méthode")."""
+    start = time.perf_counter()
+    try:
+        result = await call
+    except Exception:
+        observe_upstream("firestore", operation, "error", time.perf_counter() - start)
+        raise
+    observe_upstream("firestore", operation, "ok", time.perf_counter() - start)
+    return result
+
+
+@contextmanager
+def request_timings():
+    """Active la collecte Server-Timing pour la requête en cours et fournit le dictionnaire des temps."""
+    timings = {} if SERVER_TIMING_ENABLED else None
+    token = _request_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+
+
+def server_timing_header(timings: Dict[str, list], total: float) -> str:
+    """Valeur de l'en-tête Server-Timing : temps cumulé et nombre d'appels par service, puis durée totale."""
+    parts = [f'{name};dur={seconds * 1000:.1f};desc="{count} appel(s)"' for name, (seconds, count) in timings.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+class RequestMetricsMiddleware:
+    """
+    Middleware ASGI : mesure la durée de chaque requête HTTP par route (modèle de chemin, ex.
+    /movie/{movie_id}) jusqu'à l'envoi des en-têtes et, avec SERVER_TIMING=1, ajoute l'en-tête
+    Server-Timing (temps passé dans TMDB, en attente du limiteur TMDB et dans Firestore ; pour le
+    streaming, avant le premier octet). Écrit en ASGI pur plutôt qu'avec @app.middleware("http") :
+    l'endpoint garde ainsi accès au canal `receive` et voit les déconnexions du client.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        started = False
+
+        def observe(status_code) -> float:
+            elapsed = time.perf_counter() - start
+            route = scope.get("route")
+            HTTP_REQUEST_DURATION.labels(
+                scope["method"], route.path if route is not None else "non_routée", status_code
+            ).observe(elapsed)
+            update_threadpool_depth(asyncio.get_running_loop())
+            return elapsed
+
+        with request_timings() as timings:
+            async def send_with_metrics(message):
+                nonlocal started
+                if message["type"] == "http.response.start":
+                    started = True
+                    elapsed = observe(message["status"])
+                    if timings is not None:
+                        headers = list(message.get("headers", []))
+                        headers.append((b"server-timing", server_timing_header(timings, elapsed).encode("latin-1")))
+                        message = {**message, "headers": headers}
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_metrics)
+            except Exception:
+                if not started:
+                    observe(500)
+                raise
+
+
+def update_threadpool_depth(loop):
+    """Met à jour la jauge de file d'attente de l'exécuteur par défaut de la boucle."""
+    executor = getattr(loop, "_default_executor", None)
+    work_queue = getattr(executor, "_work_queue", None)
+    THREADPOOL_QUEUE_DEPTH.set(work_queue.qsize() if work_queue is not None else 0)
+
+
+def render_metrics():
+    """
+    Métriques au format texte Prometheus. Avec plusieurs workers, PROMETHEUS_MULTIPROC_DIR
+    doit pointer vers un dossier partagé : les métriques de tous les processus sont alors agrégées.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -1,119 +1,1464 @@
 # app/recommender.py
 
+import os
+import re
+import sys
+import uuid
+import shutil
+import json
+import time
+import logging
+import threading
 import pandas as pd
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
+from scipy import sparse
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS, TfidfVectorizer
+
+from metrics import RECOMMENDER_BUILD_DURATION, RECOMMENDER_SCORE_DURATION
+
+logger = logging.getLogger(__name__)
 
 # --- Chargement et préparation des données ---
-try:
-    items_df = pd.read_csv('data/items.csv') # Le chemin est relatif à l'endroit où l'API sera lancée
-    users_df = pd.read_csv('data/users.csv')
-except FileNotFoundError:
-    # Gérer le cas où les fichiers ne sont pas trouvés (utile pour le déploiement ou si le chemin change)
-    print("Erreur : Les fichiers data/items.csv ou data/users.csv n'ont pas été trouvés.")
-    print("Veuillez vous assurer que le dossier 'data' est au même niveau que le dossier 'app'.")
-    # Créer des DataFrames vides ou de démonstration pour éviter une erreur fatale
-    items_df = pd.DataFrame(columns=['item_id', 'title', 'genre'])
-    users_df = pd.DataFrame(columns=['user_id', 'item_id', 'liked'])
-
-
-# Création de la matrice de user-item
-# Utiliser un try-except pour le cas où users_df est vide après un FileNotFoundError
-try:
-    user_item_matrix = users_df.pivot_table(index='user_id', columns='item_id', values='liked').fillna(0)
-except Exception as e:
-    print(f"Erreur lors de la création de la matrice user-item : {e}")
-    user_item_matrix = pd.DataFrame() # DataFrame vide si erreur
-
-# Calcul de la similarité entre utilisateurs (si la matrice n'est pas vide)
-user_similarity_df = pd.DataFrame() # Initialisation par défaut
-if not user_item_matrix.empty:
-    user_similarity_df = pd.DataFrame(cosine_similarity(user_item_matrix), index=user_item_matrix.index, columns=user_item_matrix.index)
+ITEMS_CSV_PATH = 'data/items.csv' # Le chemin est relatif à l'endroit où l'API sera lancée
+USERS_CSV_PATH = 'data/users.csv'
+# Fichiers lus au démarrage (CSV ou Parquet, selon l'extension) en l'absence de snapshot
+ITEMS_PATH = os.getenv("RECOMMENDER_ITEMS_PATH", ITEMS_CSV_PATH)
+INTERACTIONS_PATH = os.getenv("RECOMMENDER_INTERACTIONS_PATH", USERS_CSV_PATH)
+SNAPSHOT_DIR = os.getenv("RECOMMENDER_SNAPSHOT_DIR", "data/snapshot")
+SNAPSHOT_FORMAT_VERSION = 4
+
+
+def peak_rss_mb():
+    """Mémoire résidente de pointe du processus (Mo), ou None si la plateforme ne la fournit pas."""
+    try:
+        import resource
+    except ImportError:
+        # Windows : pic du working set via psutil, s'il est installé
+        try:
+            import psutil
+            return psutil.Process().memory_info().peak_wset / (1024 * 1024)
+        except (ImportError, AttributeError):
+            return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+# --- Ingestion en flux (CSV ou Parquet) ---
+INGEST_CHUNK_ROWS = 1_000_000  # Nombre de lignes lues par bloc
+PARQUET_SUFFIXES = ('.parquet', '.pq')
+# Types compacts à la lecture : les identifiants tiennent sur 32 bits, les genres sont des catégories
+INTERACTION_DTYPES = {'user_id': np.int32, 'item_id': np.int32, 'liked': np.float32}
+ITEM_DTYPES = {'item_id': np.int32, 'title': object, 'genre': 'category'}
+
+
+def iter_table_chunks(path, dtypes, chunk_rows=None):
+    """
+    Lit les colonnes `dtypes` d'un fichier CSV ou Parquet (selon l'extension) par blocs de
+    `chunk_rows` lignes, ou en un seul bloc si chunk_rows est None, convertis aux types donnés.
+    La lecture Parquet nécessite pyarrow (dépendance optionnelle).
+    """
+    columns = list(dtypes)
+    if path.endswith(PARQUET_SUFFIXES):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("La lecture des fichiers Parquet nécessite pyarrow (pip install pyarrow).")
+        parquet_file = pq.ParquetFile(path)
+        if chunk_rows is None:
+            batches = [parquet_file.read(columns=columns)]
+        else:
+            batches = parquet_file.iter_batches(batch_size=chunk_rows, columns=columns)
+        for batch in batches:
+            yield batch.to_pandas().astype(dtypes)
+    elif chunk_rows is None:
+        yield pd.read_csv(path, usecols=columns, dtype=dtypes)
+    else:
+        yield from pd.read_csv(path, usecols=columns, dtype=dtypes, chunksize=chunk_rows)
+
+
+# --- Paramètres du moteur creux ---
+NUM_NEIGHBORS = 50            # Nombre de voisins (k) conservés par utilisateur
+NUM_ITEM_NEIGHBORS = 50       # Nombre d'items similaires conservés par item (moteur item-item)
+NEIGHBOR_BLOCK_SIZE = 1024    # Nombre d'utilisateurs traités par bloc lors du calcul des voisins
+BATCH_CHUNK_SIZE = 1024       # Nombre d'utilisateurs scorés par produit matriciel dans le mode batch
+REBUILD_EVERY = 1000          # Nombre de mises à jour incrémentales avant une reconstruction complète
+
+# --- Recherche de voisins approximative (LSH) ---
+# "exact" : table des k voisins précalculée ; "lsh" : hachage par hyperplans aléatoires
+NEIGHBOR_BACKEND = os.getenv("RECOMMENDER_NEIGHBOR_BACKEND", "exact")
+# Réglage retenu d'après `--lsh-report` (5000 utilisateurs, k=20) : rappel ~0.86 pour ~1200 candidats,
+# contre ~0.43 pour 16 tables x 8 bits et ~0.60 pour 4 x 4
+LSH_NUM_TABLES = 32           # Nombre de tables de hachage (plus de tables = meilleur rappel, plus de candidats)
+LSH_NUM_BITS = 7              # Nombre maximal d'hyperplans par table (plus de bits = seaux plus petits)
+LSH_MAX_CANDIDATES = 2000     # Nombre maximal de candidats reclassés par similarité exacte
+
+# --- Factorisation matricielle (ALS implicite) ---
+ALS_FACTORS = 64              # Dimension des embeddings utilisateurs/items
+ALS_ITERATIONS = 15           # Nombre d'itérations alternées
+ALS_REGULARIZATION = 0.1      # Régularisation L2
+ALS_ALPHA = 40.0              # Poids de confiance des likes : c = 1 + alpha * like
+
+# --- Filtrage basé sur le contenu ---
+GENRE_DELIMITERS = r'[|,;/]'  # Séparateurs des genres multiples d'un item ("Action|Drame")
+TITLE_FEATURE_WEIGHT = 0.5    # Poids des mots du titre par rapport aux genres dans les vecteurs items
+# Mots vides ignorés dans les titres : sans eux, "the" suffit à rapprocher deux films sans rapport
+FRENCH_STOP_WORDS = frozenset((
+    'le', 'la', 'les', 'un', 'une', 'des', 'du', 'de', 'au', 'aux', 'et', 'ou', 'en', 'sur', 'sous',
+    'dans', 'par', 'pour', 'avec', 'sans', 'ce', 'ces', 'cet', 'cette', 'qui', 'que', 'ne', 'pas',
+))
+TITLE_STOP_WORDS = ENGLISH_STOP_WORDS | FRENCH_STOP_WORDS
+
+# Moteur collaboratif utilisé par get_recommendations : "user", "item" ou "als"
+COLLABORATIVE_ENGINE = os.getenv("RECOMMENDER_COLLABORATIVE_ENGINE", "user")
+
+# Verrou sérialisant les écritures sur le modèle (mises à jour, reconstruction, snapshot)
+_model_lock = threading.Lock()
+
+
+def build_interaction_matrix(interactions_df):
+    """
+    Construit la matrice user-item creuse (CSR, float32) à partir des interactions.
+    Retourne la matrice ainsi que les identifiants utilisateurs et items (int32, triés)
+    correspondant à ses lignes et à ses colonnes.
+    """
+    interactions_df = interactions_df.dropna(subset=['liked'])
+    return _sparse_interactions(
+        interactions_df['user_id'].to_numpy(dtype=np.int32, copy=True),
+        interactions_df['item_id'].to_numpy(dtype=np.int32, copy=True),
+        interactions_df['liked'].to_numpy(dtype=np.float32)
+    )
+
+
+def read_interactions(path=INTERACTIONS_PATH, chunk_rows=INGEST_CHUNK_ROWS):
+    """
+    Construit la matrice d'interactions directement à partir d'un fichier CSV ou Parquet lu
+    par blocs : seules les colonnes user_id, item_id (int32) et liked (float32) sont gardées,
+    soit 12 octets par interaction au lieu d'un DataFrame int64/float64 complet.
+    Même résultat que build_interaction_matrix sur le fichier entier.
+    """
+    user_chunks, item_chunks, value_chunks = [], [], []
+    for chunk in iter_table_chunks(path, INTERACTION_DTYPES, chunk_rows):
+        values = chunk['liked'].to_numpy(dtype=np.float32)
+        keep = ~np.isnan(values)
+        user_chunks.append(chunk['user_id'].to_numpy(dtype=np.int32)[keep])
+        item_chunks.append(chunk['item_id'].to_numpy(dtype=np.int32)[keep])
+        value_chunks.append(values[keep])
+    return _sparse_interactions(_concatenate(user_chunks, np.int32), _concatenate(item_chunks, np.int32),
+                                _concatenate(value_chunks, np.float32))
+
+
+def _concatenate(chunks, dtype):
+    """Concatène une liste de blocs et la vide aussitôt (les blocs sont libérés un tableau à la fois)."""
+    array = np.concatenate(chunks) if chunks else np.empty(0, dtype=dtype)
+    chunks.clear()
+    return array
+
+
+def _positions_in_place(sorted_ids, values, block_size=INGEST_CHUNK_ROWS):
+    """Remplace chaque identifiant de `values` (int32) par sa position dans sorted_ids, bloc par bloc."""
+    for start in range(0, len(values), block_size):
+        values[start:start + block_size] = np.searchsorted(sorted_ids, values[start:start + block_size])
+    return values
+
+
+def _sparse_interactions(raw_user_ids, raw_item_ids, values):
+    """
+    Matrice CSR float32 des interactions (les tableaux d'identifiants int32 sont réutilisés pour
+    les indices). Les doublons (user_id, item_id) sont moyennés, comme le faisait pivot_table.
+    """
+    user_ids = np.unique(raw_user_ids)
+    item_ids = np.unique(raw_item_ids)
+    rows = _positions_in_place(user_ids, raw_user_ids)
+    cols = _positions_in_place(item_ids, raw_item_ids)
+
+    shape = (len(user_ids), len(item_ids))
+    matrix = sparse.csr_matrix((values, (rows, cols)), shape=shape, dtype=np.float32)
+    if matrix.nnz < len(values):
+        # Doublons sommés par la conversion : division par le nombre d'occurrences de chaque case
+        counts = sparse.csr_matrix((np.ones(len(values), dtype=np.float32), (rows, cols)), shape=shape)
+        counts.data = 1.0 / counts.data
+        matrix = matrix.multiply(counts).tocsr().astype(np.float32)
+    matrix.eliminate_zeros()
+    matrix.sort_indices()
+    return matrix, user_ids.astype(np.int32), item_ids.astype(np.int32)
+
+
+def _row_norms(matrix):
+    """Normes L2 (float64) des lignes d'une matrice creuse."""
+    return np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1), dtype=np.float64).ravel())
+
+
+def _top_k(candidates, scores, user_row, k):
+    """
+    Sélectionne les k meilleurs voisins (score > 0, hors utilisateur lui-même), triés par
+    score décroissant puis par indice utilisateur pour un ordre déterministe.
+    Les scores sont comparés en float32, la précision stockée dans l'index.
+    """
+    scores = np.asarray(scores, dtype=np.float32)
+    keep = (candidates != user_row) & (scores > 0)
+    candidates, scores = candidates[keep], scores[keep]
+    if len(candidates) > k:
+        threshold = np.partition(scores, len(scores) - k)[len(scores) - k]
+        keep = scores >= threshold
+        candidates, scores = candidates[keep], scores[keep]
+
+    order = np.lexsort((candidates, -scores))[:k]
+    return candidates[order], scores[order]
+
+
+def build_neighbor_index(matrix, k=NUM_NEIGHBORS, block_size=NEIGHBOR_BLOCK_SIZE):
+    """
+    Calcule, pour chaque utilisateur, ses k voisins les plus proches (similarité cosinus > 0).
+    Le calcul se fait par blocs de lignes sur la matrice creuse normalisée : la matrice
+    de similarité complète users x users n'est jamais construite.
+    Retourne deux tableaux (n_users, k) : indices des voisins (int32, -1 si absent) et scores (float32).
+    """
+    n_users = matrix.shape[0]
+    k = max(min(k, n_users - 1), 0)
+    neighbor_indices = np.full((n_users, k), -1, dtype=np.int32)
+    neighbor_scores = np.zeros((n_users, k), dtype=np.float32)
+    if k == 0:
+        return neighbor_indices, neighbor_scores
+
+    # Normalisation L2 des lignes : le produit scalaire devient la similarité cosinus
+    norms = _row_norms(matrix)
+    inverse_norms = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    normalized = sparse.diags(inverse_norms) @ matrix.astype(np.float64)
+    normalized = normalized.tocsr()
+    normalized_t = normalized.T.tocsr()
+
+    for start in range(0, n_users, block_size):
+        stop = min(start + block_size, n_users)
+        block = (normalized[start:stop] @ normalized_t).tocsr()
+        for offset in range(stop - start):
+            user_row = start + offset
+            row_start, row_end = block.indptr[offset], block.indptr[offset + 1]
+            candidates, scores = _top_k(block.indices[row_start:row_end], block.data[row_start:row_end], user_row, k)
+            neighbor_indices[user_row, :len(candidates)] = candidates
+            neighbor_scores[user_row, :len(candidates)] = scores
+
+    return neighbor_indices, neighbor_scores
+
+
+def build_item_neighbor_index(matrix, k=NUM_ITEM_NEIGHBORS, block_size=NEIGHBOR_BLOCK_SIZE):
+    """
+    Calcule, pour chaque item (colonne), ses k items les plus similaires (cosinus entre les
+    colonnes des likes). Même calcul par blocs que pour les utilisateurs, sur la matrice transposée.
+    """
+    liked_matrix = (matrix == 1).astype(np.float32)
+    return build_neighbor_index(liked_matrix.T.tocsr(), k=k, block_size=block_size)
+
+
+class IdIndex:
+    """
+    Correspondance identifiant -> indice par recherche dichotomique sur le tableau des
+    identifiants, qui peut être mappé en mémoire : aucun dictionnaire Python de la taille
+    du nombre d'utilisateurs n'est construit au démarrage. Les identifiants ajoutés
+    après coup (mises à jour incrémentales) sont gardés dans un dictionnaire annexe.
+    """
+
+    def __init__(self, ids):
+        if len(ids) > 1 and not np.all(ids[1:] > ids[:-1]):
+            self._order = np.argsort(ids, kind='stable').astype(np.int32)
+            self._sorted_ids = ids[self._order]
+        else:
+            self._order = None
+            self._sorted_ids = ids
+        self._extra = {}
+
+    def __len__(self):
+        return len(self._sorted_ids) + len(self._extra)
+
+    def __contains__(self, value):
+        return self.get(value) is not None
+
+    def __getitem__(self, value):
+        index = self.get(value)
+        if index is None:
+            raise KeyError(value)
+        return index
+
+    def __setitem__(self, value, index):
+        self._extra[int(value)] = index
+
+    def get(self, value, default=None):
+        """Retourne l'indice associé à un identifiant, ou `default` s'il est inconnu."""
+        value = np.int64(value)
+        position = int(np.searchsorted(self._sorted_ids, value))
+        if position < len(self._sorted_ids) and self._sorted_ids[position] == value:
+            return int(self._order[position]) if self._order is not None else position
+        return self._extra.get(int(value), default)
+
+    def lookup(self, values):
+        """Version vectorisée de get : retourne un tableau d'indices int32 (-1 si inconnu)."""
+        values = np.asarray(values, dtype=np.int64)
+        result = np.full(len(values), -1, dtype=np.int32)
+        if len(self._sorted_ids) > 0:
+            positions = np.searchsorted(self._sorted_ids, values)
+            clipped = np.minimum(positions, len(self._sorted_ids) - 1)
+            found = self._sorted_ids[clipped] == values
+            found_positions = clipped[found]
+            result[found] = self._order[found_positions] if self._order is not None else found_positions
+        if self._extra:
+            for offset in np.flatnonzero(result < 0):
+                result[offset] = self._extra.get(int(values[offset]), -1)
+        return result
+
+
+def split_genres(genre):
+    """Découpe la chaîne de genres d'un item ("Action|Drame", "Action, Drame"...) en liste de genres."""
+    if not isinstance(genre, str):
+        return []
+    return [part.strip() for part in re.split(GENRE_DELIMITERS, genre) if part.strip()]
+
+
+def _title_tokens(title):
+    """Mots (en minuscules, au moins deux caractères, hors mots vides) d'un titre."""
+    return [token for token in re.findall(r'\w+', title.lower()) if len(token) > 1 and token not in TITLE_STOP_WORDS]
+
+
+def build_content_features(titles, genres):
+    """
+    Construit la matrice creuse (n_items, n_features) des vecteurs de contenu : TF-IDF des genres
+    (un item peut en avoir plusieurs) et, avec un poids moindre, des mots du titre.
+    Les lignes sont normalisées (L2), le produit scalaire est donc une similarité cosinus.
+    """
+    blocks = []
+    for documents, analyzer, weight in ((genres, split_genres, 1.0), (titles, _title_tokens, TITLE_FEATURE_WEIGHT)):
+        try:
+            blocks.append(weight * TfidfVectorizer(analyzer=analyzer, dtype=np.float32).fit_transform(documents))
+        except ValueError:
+            # Vocabulaire vide (catalogue vide ou sans genres/titres exploitables)
+            blocks.append(sparse.csr_matrix((len(documents), 0), dtype=np.float32))
+
+    features = sparse.hstack(blocks, format='csr', dtype=np.float32)
+    norms = _row_norms(features)
+    inverse_norms = np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+    return (sparse.diags(inverse_norms.astype(np.float32)) @ features).tocsr()
+
+
+class ItemCatalog:
+    """
+    Métadonnées des items construites une seule fois au chargement.
+    Les titres et genres sont stockés en tableaux colonnes indexés par une position dense
+    (chaînes de genres encodées en catégories), avec la matrice creuse des vecteurs de contenu.
+    Tous les tableaux sont de type fixe et peuvent donc être mappés en mémoire depuis un snapshot.
+    """
+
+    def __init__(self, item_ids, titles, genre_codes, genre_names, features=None):
+        self.item_ids = np.asarray(item_ids, dtype=np.int32)
+        self.titles = np.asarray(titles, dtype=str)
+        self.genre_codes = np.asarray(genre_codes, dtype=np.int32)
+        self.genre_names = np.asarray(genre_names, dtype=str)
+        self.positions = IdIndex(self.item_ids)
+        # Genres individuels de chaque catégorie de chaîne de genres
+        self.genre_lists = [tuple(split_genres(str(name))) for name in self.genre_names]
+
+        if features is None:
+            genres = [str(self.genre_names[code]) if code >= 0 else '' for code in self.genre_codes]
+            features = build_content_features([str(title) for title in self.titles], genres)
+        self.features = features
+
+    @classmethod
+    def from_dataframe(cls, df):
+        """Construit le catalogue à partir d'un DataFrame (item_id, title, genre), en conservant l'ordre du fichier."""
+        df = df.drop_duplicates(subset=['item_id'])
+        genre_codes, genre_names = pd.factorize(df['genre'])
+        return cls(
+            df['item_id'].to_numpy(),
+            df['title'].fillna('').astype(str).to_numpy(dtype=str),
+            genre_codes,
+            np.asarray(genre_names, dtype=str)
+        )
+
+    def __len__(self):
+        return len(self.item_ids)
+
+    def position(self, item_id):
+        """Retourne la position dense d'un item, ou None s'il est absent du catalogue."""
+        return self.positions.get(item_id)
+
+    def positions_for(self, item_ids_array):
+        """Convertit un tableau d'identifiants en positions du catalogue (-1 si absent)."""
+        return self.positions.lookup(item_ids_array)
+
+    def genre(self, position):
+        """Retourne la chaîne de genres d'un item, ou None s'il n'en a pas."""
+        code = self.genre_codes[position]
+        return str(self.genre_names[code]) if code >= 0 else None
+
+    def genres_of(self, position):
+        """Retourne la liste des genres individuels d'un item."""
+        code = self.genre_codes[position]
+        return self.genre_lists[code] if code >= 0 else ()
+
+    def record(self, position, reason):
+        """Construit une recommandation au format de l'API à partir d'une position du catalogue."""
+        return {
+            'item_id': int(self.item_ids[position]),
+            'title': str(self.titles[position]),
+            'genre': self.genre(position),
+            'reason': reason
+        }
+
+
+def read_items(path=ITEMS_PATH):
+    """Catalogue lu depuis un fichier CSV ou Parquet (item_id en int32, genres en catégories)."""
+    return ItemCatalog.from_dataframe(next(iter_table_chunks(path, ITEM_DTYPES)))
+
+
+def load_model_from_files(items_path=ITEMS_PATH, interactions_path=INTERACTIONS_PATH, chunk_rows=INGEST_CHUNK_ROWS):
+    """
+    Construit le modèle à partir des fichiers (CSV ou Parquet) sans DataFrame intermédiaire
+    complet : les interactions sont lues par blocs de `chunk_rows` lignes (read_interactions).
+    Le volume chargé et la mémoire de pointe du processus sont journalisés.
+    """
+    try:
+        with RECOMMENDER_BUILD_DURATION.labels("matrix").time():
+            matrix, model_user_ids, model_item_ids = read_interactions(interactions_path, chunk_rows)
+        with RECOMMENDER_BUILD_DURATION.labels("catalog").time():
+            catalog = read_items(items_path)
+    except Exception as e:
+        logger.error("Erreur lors du chargement de %s ou %s : %s. Veuillez vous assurer que le dossier 'data' "
+                     "est au même niveau que le dossier 'app'.", items_path, interactions_path, e)
+        matrix, model_user_ids, model_item_ids = _empty_interactions()
+        catalog = ItemCatalog.from_dataframe(pd.DataFrame(columns=['item_id', 'title', 'genre']))
+
+    model = _assemble_model(matrix, model_user_ids, model_item_ids, catalog)
+    peak = peak_rss_mb()
+    logger.info("Modèle construit : %d utilisateurs, %d items, %d interactions, mémoire de pointe %s Mo",
+                len(model_user_ids), len(catalog), matrix.nnz, f"{peak:.0f}" if peak is not None else "inconnue")
+    return model
+
+
+def _empty_interactions():
+    """Matrice d'interactions vide et tableaux d'identifiants associés."""
+    return sparse.csr_matrix((0, 0), dtype=np.float32), np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+
+
+def _assemble_model(matrix, model_user_ids, model_item_ids, catalog):
+    """Calcule les index des voisins et regroupe les éléments du modèle."""
+    with RECOMMENDER_BUILD_DURATION.labels("user_neighbors").time():
+        model_neighbor_indices, model_neighbor_scores = build_neighbor_index(matrix)
+    with RECOMMENDER_BUILD_DURATION.labels("item_neighbors").time():
+        model_item_neighbor_indices, model_item_neighbor_scores = build_item_neighbor_index(matrix)
+    return {
+        'interaction_matrix': matrix,
+        'user_ids': model_user_ids,
+        'item_ids': model_item_ids,
+        'neighbor_indices': model_neighbor_indices,
+        'neighbor_scores': model_neighbor_scores,
+        'item_neighbor_indices': model_item_neighbor_indices,
+        'item_neighbor_scores': model_item_neighbor_scores,
+        'item_catalog': catalog,
+    }
+
+
+def _install_model(model):
+    """Installe un modèle comme état courant du module et reconstruit les index dérivés."""
+    global interaction_matrix, user_ids, item_ids, user_index, item_index
+    global neighbor_indices, neighbor_scores, item_neighbor_indices, item_neighbor_scores
+    global item_catalog, column_catalog_positions, _lsh_index, _als_state
+
+    interaction_matrix = model['interaction_matrix']
+    user_ids, item_ids = model['user_ids'], model['item_ids']
+    user_index, item_index = IdIndex(user_ids), IdIndex(item_ids)
+    neighbor_indices, neighbor_scores = model['neighbor_indices'], model['neighbor_scores']
+    item_neighbor_indices, item_neighbor_scores = model['item_neighbor_indices'], model['item_neighbor_scores']
+    item_catalog = model['item_catalog']
+    # Position dans le catalogue de chaque colonne de la matrice d'interactions (-1 si l'item n'a pas de métadonnées)
+    column_catalog_positions = item_catalog.positions_for(item_ids)
+    _lsh_index = None
+    _als_state = model.get('als')
+    _reset_incremental_state()
+
+
+# --- Snapshot binaire du modèle ---
+
+SNAPSHOT_ARRAYS = (
+    'user_ids', 'item_ids', 'matrix_data', 'matrix_indices', 'matrix_indptr',
+    'neighbor_indices', 'neighbor_scores', 'item_neighbor_indices', 'item_neighbor_scores',
+    'catalog_item_ids', 'catalog_titles', 'catalog_genre_codes', 'catalog_genre_names',
+    'catalog_features_data', 'catalog_features_indices', 'catalog_features_indptr',
+)
+# Facteurs ALS : facultatifs, écrits seulement s'ils ont été entraînés (voir save_snapshot)
+SNAPSHOT_ALS_ARRAYS = ('als_user_factors', 'als_item_factors', 'als_item_gram')
+
+
+def _model_arrays(matrix, als_state):
+    """Rassemble les tableaux du modèle courant à écrire dans un snapshot (sans ALS si als_state vaut None)."""
+    arrays = {
+        'user_ids': user_ids,
+        'item_ids': item_ids,
+        'matrix_data': matrix.data,
+        'matrix_indices': matrix.indices,
+        'matrix_indptr': matrix.indptr,
+        'neighbor_indices': neighbor_indices,
+        'neighbor_scores': neighbor_scores,
+        'item_neighbor_indices': item_neighbor_indices,
+        'item_neighbor_scores': item_neighbor_scores,
+        'catalog_item_ids': item_catalog.item_ids,
+        'catalog_titles': item_catalog.titles,
+        'catalog_genre_codes': item_catalog.genre_codes,
+        'catalog_genre_names': item_catalog.genre_names,
+        'catalog_features_data': item_catalog.features.data,
+        'catalog_features_indices': item_catalog.features.indices,
+        'catalog_features_indptr': item_catalog.features.indptr,
+    }
+    if als_state is not None:
+        arrays['als_user_factors'] = als_state['user_factors']
+        arrays['als_item_factors'] = als_state['item_factors']
+        arrays['als_item_gram'] = als_state['item_gram']
+    return arrays
+
+
+def save_snapshot(snapshot_dir=SNAPSHOT_DIR, with_als=False):
+    """
+    Écrit le modèle courant dans un nouveau dossier versionné de `snapshot_dir` (un fichier .npy
+    par tableau + manifest.json), puis bascule le fichier CURRENT de manière atomique.
+    Les workers déjà démarrés gardent leur version mappée ; les anciennes versions ne sont pas supprimées.
+    Le nom de version est unique (horodatage, pid et suffixe aléatoire), même pour deux écritures
+    dans la même seconde ; en cas d'échec, le dossier temporaire est supprimé.
+    Les facteurs ALS déjà chargés ou entraînés sont écrits ; avec `with_als=True`, ils sont
+    entraînés au préalable s'ils n'existent pas encore.
+    """
+    if with_als and get_als_model() is None:
+        train_als_model()
+    als_state = get_als_model()
+    with _model_lock:
+        # Les lignes modifiées depuis la dernière reconstruction sont fusionnées dans la matrice écrite
+        matrix = _current_matrix().copy()
+        matrix.eliminate_zeros()
+        matrix.sort_indices()
+        if als_state is not None and als_state['dirty_rows']:
+            # Les utilisateurs modifiés depuis l'entraînement sont recalculés par projection
+            als_state = dict(als_state, user_factors=_als_fold_in_rows(als_state, matrix, als_state['dirty_rows']), dirty_rows=set())
+        arrays = _model_arrays(matrix, als_state)
+        manifest = {
+            'format_version': SNAPSHOT_FORMAT_VERSION,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'matrix_shape': list(matrix.shape),
+            'n_users': int(matrix.shape[0]),
+            'n_items': int(matrix.shape[1]),
+            'nnz': int(matrix.nnz),
+            'catalog_features_shape': list(item_catalog.features.shape),
+            'als': als_state is not None,
+        }
+
+        version = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        target_dir = os.path.join(snapshot_dir, version)
+        temp_dir = target_dir + '.tmp'
+        os.makedirs(temp_dir)
+        try:
+            for name, array in arrays.items():
+                np.save(os.path.join(temp_dir, f'{name}.npy'), np.ascontiguousarray(array))
+        except BaseException:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise
+
+    try:
+        with open(os.path.join(temp_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        os.rename(temp_dir, target_dir)
+    except BaseException:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+
+    # Fichier temporaire propre à la version : deux processus peuvent basculer CURRENT en même temps
+    pointer_path = os.path.join(snapshot_dir, 'CURRENT')
+    pointer_temp_path = f'{pointer_path}.{version}.tmp'
+    with open(pointer_temp_path, 'w', encoding='utf-8') as f:
+        f.write(version)
+    os.replace(pointer_temp_path, pointer_path)
+    return target_dir
+
+
+def load_snapshot(snapshot_dir=SNAPSHOT_DIR):
+    """
+    Charge le snapshot pointé par CURRENT avec np.load(mmap_mode='r') : les pages sont partagées
+    entre les workers via le cache du système. Retourne None si aucun snapshot compatible n'existe.
+    """
+    try:
+        with open(os.path.join(snapshot_dir, 'CURRENT'), encoding='utf-8') as f:
+            snapshot_path = os.path.join(snapshot_dir, f.read().strip())
+        with open(os.path.join(snapshot_path, 'manifest.json'), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if manifest.get('format_version') != SNAPSHOT_FORMAT_VERSION:
+        logger.warning("Snapshot %s ignoré : version de format %s incompatible.", snapshot_path, manifest.get('format_version'))
+        return None
+
+    # Les snapshots antérieurs à l'option ALS contiennent toujours les facteurs
+    has_als = manifest.get('als', True)
+    try:
+        arrays = {
+            name: np.load(os.path.join(snapshot_path, f'{name}.npy'), mmap_mode='r')
+            for name in SNAPSHOT_ARRAYS + (SNAPSHOT_ALS_ARRAYS if has_als else ())
+        }
+    except (OSError, ValueError) as e:
+        logger.error("Erreur lors du chargement du snapshot %s : %s", snapshot_path, e)
+        return None
+
+    return {
+        'interaction_matrix': sparse.csr_matrix(
+            (arrays['matrix_data'], arrays['matrix_indices'], arrays['matrix_indptr']),
+            shape=tuple(manifest['matrix_shape'])
+        ),
+        'user_ids': arrays['user_ids'],
+        'item_ids': arrays['item_ids'],
+        'neighbor_indices': arrays['neighbor_indices'],
+        'neighbor_scores': arrays['neighbor_scores'],
+        'item_neighbor_indices': arrays['item_neighbor_indices'],
+        'item_neighbor_scores': arrays['item_neighbor_scores'],
+        'item_catalog': ItemCatalog(
+            arrays['catalog_item_ids'], arrays['catalog_titles'],
+            arrays['catalog_genre_codes'], arrays['catalog_genre_names'],
+            features=sparse.csr_matrix(
+                (arrays['catalog_features_data'], arrays['catalog_features_indices'], arrays['catalog_features_indptr']),
+                shape=tuple(manifest['catalog_features_shape'])
+            )
+        ),
+        'als': {
+            'user_factors': arrays['als_user_factors'],
+            'item_factors': arrays['als_item_factors'],
+            'item_gram': arrays['als_item_gram'],
+            'dirty_rows': set(),
+        } if has_als else None,
+    }
+
+
+# --- Mises à jour incrémentales du modèle ---
+# Entre deux reconstructions, interaction_matrix est la matrice de base et n'est plus modifiée :
+# les lignes des utilisateurs mis à jour sont conservées à part dans _row_overrides
+# (ligne -> (colonnes triées, valeurs)), et les tableaux indexés par utilisateur ou par item
+# grandissent dans des tampons à capacité doublée. Une mise à jour coûte ainsi de l'ordre de la
+# taille des lignes concernées, sans copie de la matrice ni des tables de voisins ; la
+# reconstruction suivante fusionne les lignes modifiées dans une nouvelle matrice de base.
+
+_updates_since_rebuild = 0
+_row_overrides = {}
+_base_by_item = None     # Matrice de base au format CSC (item -> utilisateurs), construite à la première mise à jour
+_base_row_norms = None   # Normes L2 des lignes de la matrice de base, construites avec _base_by_item
+_merged_matrix = None    # Cache de _current_matrix, invalidé à chaque mise à jour
+_row_buffers = {}        # Tampons à capacité libre des tableaux agrandis par _append_rows
+_EMPTY_ROW = (np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32))
+
+
+def _reset_incremental_state():
+    """Oublie les lignes modifiées et les structures dérivées de la matrice de base (nouvelle base installée)."""
+    global _row_overrides, _base_by_item, _base_row_norms, _merged_matrix, _updates_since_rebuild
+    _row_overrides = {}
+    _base_by_item = _base_row_norms = _merged_matrix = None
+    _updates_since_rebuild = 0
+
+
+def _append_rows(name, array, rows):
+    """
+    Retourne `array` suivi de `rows`, en écrivant dans la capacité libre du tampon `name` :
+    le tampon est réalloué (taille doublée) seulement s'il est plein, ou si `array` n'en est pas
+    une vue (tableau d'un nouveau modèle, ou mappé en lecture seule depuis un snapshot).
+    Les vues déjà lues par d'autres threads ne voient pas les lignes ajoutées.
+    """
+    rows = np.asarray(rows, dtype=array.dtype).reshape((-1,) + array.shape[1:])
+    length, needed = len(array), len(array) + len(rows)
+    buffer = _row_buffers.get(name)
+    if buffer is None or array.base is not buffer or len(buffer) < needed:
+        buffer = np.empty((max(needed, 2 * length, 16),) + array.shape[1:], dtype=array.dtype)
+        buffer[:length] = array
+        _row_buffers[name] = buffer
+    buffer[length:needed] = rows
+    return buffer[:needed]
+
+
+def _current_row(user_row):
+    """Colonnes (triées) et valeurs courantes d'une ligne : sa version modifiée, sinon celle de la matrice de base."""
+    override = _row_overrides.get(user_row)
+    if override is not None:
+        return override
+    if user_row >= interaction_matrix.shape[0]:
+        return _EMPTY_ROW
+    row_start, row_end = interaction_matrix.indptr[user_row], interaction_matrix.indptr[user_row + 1]
+    return interaction_matrix.indices[row_start:row_end], interaction_matrix.data[row_start:row_end]
+
+
+def _rows_from_lists(row_list, n_columns):
+    """Matrice CSR (len(row_list), n_columns) construite à partir de couples (colonnes, valeurs)."""
+    lengths = np.fromiter((len(columns) for columns, _ in row_list), dtype=np.int64, count=len(row_list))
+    indptr = np.concatenate(([0], np.cumsum(lengths)))
+    if len(row_list):
+        indices = np.concatenate([columns for columns, _ in row_list]).astype(np.int32)
+        data = np.concatenate([values for _, values in row_list]).astype(np.float32)
+    else:
+        indices, data = _EMPTY_ROW
+    return sparse.csr_matrix((data, indices, indptr), shape=(len(row_list), n_columns))
+
+
+def _user_rows(rows):
+    """
+    Lignes courantes (CSR, une colonne par item) des utilisateurs `rows` (entier ou tableau),
+    lignes modifiées comprises, sans matérialiser toute la matrice.
+    """
+    rows = np.atleast_1d(np.asarray(rows, dtype=np.int64))
+    n_items, base, overrides = len(item_ids), interaction_matrix, _row_overrides
+    dirty = np.zeros(len(rows), dtype=bool)
+    if overrides:
+        dirty = np.isin(rows, np.fromiter(overrides, dtype=np.int64, count=len(overrides)))
+
+    clean_part = base[rows[~dirty]]
+    clean_part = sparse.csr_matrix((clean_part.data, clean_part.indices, clean_part.indptr), shape=(clean_part.shape[0], n_items))
+    if not dirty.any():
+        return clean_part
+    dirty_part = _rows_from_lists([overrides[row] for row in rows[dirty].tolist()], n_items)
+    # Lignes propres puis modifiées, remises dans l'ordre demandé
+    order = np.concatenate((np.flatnonzero(~dirty), np.flatnonzero(dirty)))
+    position = np.empty_like(order)
+    position[order] = np.arange(len(order))
+    return sparse.vstack([clean_part, dirty_part], format='csr')[position]
+
+
+class _CurrentRows:
+    """Accès aux lignes courantes (voir _user_rows) avec l'interface utilisée par LSHIndex.query."""
+
+    def __getitem__(self, rows):
+        return _user_rows(rows)
+
+    @property
+    def shape(self):
+        return (len(user_ids), len(item_ids))
+
+
+current_rows = _CurrentRows()
+
+
+def _current_matrix():
+    """
+    Matrice d'interactions courante (base + lignes modifiées), matérialisée en O(nnz) et mise
+    en cache jusqu'à la mise à jour suivante : réservée aux traitements de toute la matrice
+    (reconstruction, snapshot, LSH, ALS, recommandations par lot).
+    """
+    global _merged_matrix
+    merged = _merged_matrix
+    if merged is not None:
+        return merged
+
+    n_users, n_items, base, overrides = len(user_ids), len(item_ids), interaction_matrix, _row_overrides
+    indptr = np.concatenate((base.indptr, np.full(n_users - base.shape[0], base.indptr[-1], dtype=base.indptr.dtype)))
+    if overrides:
+        dirty_rows = np.fromiter(overrides, dtype=np.int64, count=len(overrides))
+        keep_rows = np.ones(n_users, dtype=bool)
+        keep_rows[dirty_rows] = False
+        keep = np.repeat(keep_rows, np.diff(indptr))
+        indptr = np.concatenate(([0], np.cumsum(np.diff(indptr) * keep_rows)))
+        merged = sparse.csr_matrix((base.data[keep], base.indices[keep], indptr), shape=(n_users, n_items))
+        dirty_rows.sort()
+        changes = _rows_from_lists([overrides[row] for row in dirty_rows.tolist()], n_items)
+        placement = sparse.csr_matrix(
+            (np.ones(len(dirty_rows), dtype=np.float32), (dirty_rows, np.arange(len(dirty_rows)))),
+            shape=(n_users, len(dirty_rows))
+        )
+        merged = (merged + placement @ changes).tocsr()
+    else:
+        merged = sparse.csr_matrix((base.data, base.indices, indptr), shape=(n_users, n_items))
+    _merged_matrix = merged
+    return merged
+
+
+def _row_norms_of(rows):
+    """Normes L2 (float64) des lignes courantes `rows`, lues dans le cache des normes de la base si possible."""
+    in_base = rows < len(_base_row_norms)
+    norms = np.zeros(len(rows), dtype=np.float64)
+    norms[in_base] = _base_row_norms[rows[in_base]]
+    recomputed = ~in_base
+    if _row_overrides:
+        recomputed |= np.isin(rows, np.fromiter(_row_overrides, dtype=np.int64, count=len(_row_overrides)))
+    for offset in np.flatnonzero(recomputed).tolist():
+        values = np.asarray(_current_row(int(rows[offset]))[1], dtype=np.float64)
+        norms[offset] = np.sqrt(values @ values)
+    return norms
+
+
+def _similarities_to(user_row):
+    """
+    Similarités cosinus entre un utilisateur et les utilisateurs partageant au moins un item avec lui.
+    Les produits scalaires sont lus dans les colonnes de ses items de la matrice de base (format
+    CSC) puis corrigés pour les lignes modifiées : le coût dépend du nombre d'interactions de ces
+    items, pas de la taille de la matrice. Retourne (indices des utilisateurs, scores float64).
+    """
+    global _base_by_item, _base_row_norms
+    if _base_by_item is None:
+        _base_by_item = interaction_matrix.tocsc()
+        _base_row_norms = _row_norms(interaction_matrix)
+
+    columns, values = _current_row(user_row)
+    in_base = columns < _base_by_item.shape[1]
+    item_columns = _base_by_item[:, columns[in_base]]
+    contributions = item_columns.data * np.repeat(np.asarray(values[in_base], dtype=np.float64), np.diff(item_columns.indptr))
+    candidates, inverse = np.unique(item_columns.indices, return_inverse=True)
+    dots = np.bincount(inverse, weights=contributions, minlength=len(candidates))
+
+    if _row_overrides:
+        # Les lignes modifiées remplacent leur version de base
+        dirty_rows = np.fromiter(_row_overrides, dtype=np.int64, count=len(_row_overrides))
+        keep = ~np.isin(candidates, dirty_rows)
+        user_vector = np.zeros(len(item_ids), dtype=np.float64)
+        user_vector[columns] = values
+        dirty_dots = _user_rows(dirty_rows) @ user_vector
+        nonzero = dirty_dots != 0
+        candidates = np.concatenate((candidates[keep], dirty_rows[nonzero]))
+        dots = np.concatenate((dots[keep], dirty_dots[nonzero]))
+
+    candidates = candidates.astype(np.int32)
+    norms = _row_norms_of(candidates)
+    user_norm = _row_norms_of(np.array([user_row]))[0]
+    denominators = norms * user_norm
+    return candidates, np.divide(dots, denominators, out=np.zeros(len(candidates)), where=denominators > 0)
+
+
+def _cosine_scores(matrix, user_row, candidates, dots=None):
+    """Similarités cosinus (float64) entre un utilisateur et une liste d'utilisateurs candidats."""
+    if dots is None:
+        dots = (matrix[candidates] @ matrix[user_row].T).toarray().ravel()
+    norms = _row_norms(matrix[np.append(candidates, user_row)])
+    denominators = norms[:-1] * norms[-1]
+    return np.divide(np.asarray(dots, dtype=np.float64), denominators, out=np.zeros(len(candidates)), where=denominators > 0)
+
+
+def _merge_neighbors(rows, neighbor_row, scores):
+    """
+    Met à jour les listes des k voisins des utilisateurs `rows` avec leurs nouvelles similarités
+    `scores` vers `neighbor_row` (0 pour le retirer), en un seul tri par ligne : même ordre que
+    _top_k (score float32 décroissant puis indice croissant).
+    """
+    width = neighbor_indices.shape[1]
+    current = neighbor_indices[rows]
+    current_scores = neighbor_scores[rows]
+    scores = np.asarray(scores, dtype=np.float32)[:, None]
+
+    candidates = np.concatenate((current, np.full((len(rows), 1), neighbor_row, dtype=current.dtype)), axis=1)
+    candidate_scores = np.concatenate((current_scores, scores), axis=1)
+    valid = np.concatenate(((current >= 0) & (current != neighbor_row), scores > 0), axis=1)
+    candidate_scores = np.where(valid, candidate_scores, -np.inf)
+
+    order = np.lexsort((candidates, -candidate_scores), axis=1)[:, :width]
+    kept = np.take_along_axis(valid, order, axis=1)
+    neighbor_indices[rows] = np.where(kept, np.take_along_axis(candidates, order, axis=1), -1)
+    neighbor_scores[rows] = np.where(kept, np.take_along_axis(candidate_scores, order, axis=1), 0)
+
+
+def update_interaction(user_id, item_id, liked):
+    """
+    Ajoute ou retire une interaction (like/favori) sans recalculer tout le modèle.
+    La nouvelle ligne de l'utilisateur est enregistrée dans _row_overrides, puis seules sa liste
+    de voisins et celles des utilisateurs concernés sont recalculées. Une reconstruction complète
+    est faite toutes les REBUILD_EVERY mises à jour pour fusionner les lignes modifiées dans la
+    matrice de base et corriger les listes de voisins.
+    """
+    global user_ids, item_ids, neighbor_indices, neighbor_scores
+    global column_catalog_positions, _updates_since_rebuild, _merged_matrix
+
+    user_id, item_id = int(user_id), int(item_id)
+    value = np.float32(1 if liked else 0)
+
+    with _model_lock:
+        if not neighbor_indices.flags.writeable:
+            # Tables issues d'un snapshot mappé en lecture seule : copie dans un tampon à la première écriture
+            neighbor_indices = _append_rows('neighbor_indices', neighbor_indices, [])
+            neighbor_scores = _append_rows('neighbor_scores', neighbor_scores, [])
+
+        if user_id not in user_index:
+            if value == 0:
+                return
+            user_index[user_id] = len(user_ids)
+            user_ids = _append_rows('user_ids', user_ids, [user_id])
+            neighbor_indices = _append_rows('neighbor_indices', neighbor_indices, np.full((1, neighbor_indices.shape[1]), -1))
+            neighbor_scores = _append_rows('neighbor_scores', neighbor_scores, np.zeros((1, neighbor_scores.shape[1])))
+        if item_id not in item_index:
+            if value == 0:
+                return
+            item_index[item_id] = len(item_ids)
+            item_ids = _append_rows('item_ids', item_ids, [item_id])
+            position = item_catalog.position(item_id)
+            column_catalog_positions = _append_rows('column_catalog_positions', column_catalog_positions, [-1 if position is None else position])
+
+        user_row, column = user_index[user_id], item_index[item_id]
+        old_candidates, _ = _similarities_to(user_row)
+
+        columns, values = _current_row(user_row)
+        position = np.searchsorted(columns, column)
+        present = position < len(columns) and columns[position] == column
+        if present and value == 0:
+            columns, values = np.delete(columns, position), np.delete(values, position)
+        elif present:
+            values = values.copy()
+            values[position] = value
+        elif value != 0:
+            columns, values = np.insert(columns, position, column), np.insert(values, position, value)
+        _row_overrides[user_row] = (columns.astype(np.int32), values.astype(np.float32))
+        _merged_matrix = None
+        if _als_state is not None:
+            _als_state['dirty_rows'].add(user_row)
+
+        _updates_since_rebuild += 1
+        if _updates_since_rebuild >= REBUILD_EVERY:
+            _rebuild_locked()
+            return
+
+        # Recalcul de la ligne de l'utilisateur, puis de sa colonne chez les utilisateurs concernés
+        candidates, scores = _similarities_to(user_row)
+        width = neighbor_indices.shape[1]
+        own_candidates, own_scores = _top_k(candidates, scores, user_row, width)
+        neighbor_indices[user_row] = -1
+        neighbor_scores[user_row] = 0
+        neighbor_indices[user_row, :len(own_candidates)] = own_candidates
+        neighbor_scores[user_row, :len(own_candidates)] = own_scores
+
+        # Utilisateurs qui partageaient ou partagent un item avec lui (score 0 : il sort de leur liste)
+        order = np.argsort(candidates)
+        candidates, scores = candidates[order], scores[order]
+        other_rows = np.union1d(old_candidates, candidates)
+        other_rows = other_rows[other_rows != user_row]
+        positions = np.minimum(np.searchsorted(candidates, other_rows), max(len(candidates) - 1, 0))
+        other_scores = np.zeros(len(other_rows), dtype=np.float64)
+        if len(candidates):
+            found = candidates[positions] == other_rows
+            other_scores[found] = scores[positions[found]]
+        _merge_neighbors(other_rows, user_row, other_scores)
+
+
+@RECOMMENDER_BUILD_DURATION.labels("rebuild").time()
+def _rebuild_locked():
+    """Fusionne les lignes modifiées, compacte la matrice et recalcule les index des voisins (le verrou doit être détenu)."""
+    global interaction_matrix, neighbor_indices, neighbor_scores, _lsh_index
+    global item_neighbor_indices, item_neighbor_scores
+
+    matrix = _current_matrix().copy()
+    matrix.eliminate_zeros()
+    matrix.sort_indices()
+    new_neighbor_indices, new_neighbor_scores = build_neighbor_index(matrix)
+    new_item_neighbor_indices, new_item_neighbor_scores = build_item_neighbor_index(matrix)
+
+    # La nouvelle base est installée avant l'oubli des lignes modifiées : un lecteur concurrent
+    # voit toujours des lignes à jour
+    interaction_matrix = matrix
+    _reset_incremental_state()
+    neighbor_indices, neighbor_scores = new_neighbor_indices, new_neighbor_scores
+    item_neighbor_indices, item_neighbor_scores = new_item_neighbor_indices, new_item_neighbor_scores
+    _lsh_index = None
+
+
+def rebuild_model():
+    """Reconstruction complète du modèle à partir de la matrice d'interactions courante."""
+    with _model_lock:
+        _rebuild_locked()
+
+
+def refresh_item_neighbors():
+    """
+    Recalcule uniquement les listes d'items similaires (moteur item-item), par exemple
+    depuis une tâche hors ligne. Elles ne sont pas mises à jour par update_interaction.
+    """
+    global item_neighbor_indices, item_neighbor_scores
+
+    with _model_lock:
+        matrix = _current_matrix()
+    new_item_neighbor_indices, new_item_neighbor_scores = build_item_neighbor_index(matrix)
+    with _model_lock:
+        item_neighbor_indices, item_neighbor_scores = new_item_neighbor_indices, new_item_neighbor_scores
+
+# --- Index de voisins approximatif (LSH) ---
+
+class LSHIndex:
+    """
+    Index approximatif des voisins par LSH à hyperplans aléatoires (similarité cosinus).
+    Chaque table hache un utilisateur sur `num_bits` bits (signe de ses projections sur des
+    hyperplans gaussiens). Les candidats d'une requête sont les utilisateurs partageant un seau
+    avec lui dans au moins une table ; ils sont ensuite reclassés par similarité cosinus exacte.
+    """
+
+    def __init__(self, num_tables=LSH_NUM_TABLES, num_bits=None, max_candidates=LSH_MAX_CANDIDATES, seed=0):
+        if num_bits is not None and not 1 <= num_bits <= 62:
+            raise ValueError("num_bits doit être compris entre 1 et 62.")
+        self.num_tables = num_tables
+        self.num_bits = num_bits
+        self.max_candidates = max_candidates
+        self.seed = seed
+        self.effective_bits = num_bits or LSH_NUM_BITS
+        self.planes = None
+        self.sorted_hashes = None
+        self.order = None
+
+    def fit(self, matrix, block_size=NEIGHBOR_BLOCK_SIZE):
+        """
+        Hache tous les utilisateurs de la matrice, par blocs, et trie chaque table par valeur de hachage.
+        Si `num_bits` n'est pas fixé, il vaut LSH_NUM_BITS, réduit sur une petite base pour garder
+        des seaux d'au moins ~16 utilisateurs ; une valeur explicite est utilisée telle quelle.
+        """
+        if self.num_bits is None:
+            self.effective_bits = int(max(1, min(LSH_NUM_BITS, np.log2(max(matrix.shape[0], 2)) - 4)))
+            if self.effective_bits < LSH_NUM_BITS:
+                logger.info("Index LSH : %d bits par table au lieu de %d (%d utilisateurs)",
+                            self.effective_bits, LSH_NUM_BITS, matrix.shape[0])
+        else:
+            self.effective_bits = self.num_bits
+        rng = np.random.default_rng(self.seed)
+        self.planes = rng.standard_normal((matrix.shape[1], self.num_tables * self.effective_bits)).astype(np.float32)
+
+        hashes = np.empty((matrix.shape[0], self.num_tables), dtype=np.int64)
+        for start in range(0, matrix.shape[0], block_size):
+            hashes[start:start + block_size] = self._hash(matrix[start:start + block_size])
+
+        self.order = np.argsort(hashes, axis=0, kind='stable').astype(np.int32)
+        self.sorted_hashes = np.take_along_axis(hashes, self.order, axis=0)
+        return self
+
+    def _hash(self, rows):
+        """Valeurs de hachage (n_rows, num_tables) d'un bloc de lignes de la matrice."""
+        # Les items apparus après la construction de l'index sont ignorés
+        rows = rows[:, :self.planes.shape[0]]
+        projections = np.asarray(rows @ self.planes).reshape(rows.shape[0], self.num_tables, self.effective_bits)
+        weights = np.left_shift(np.int64(1), np.arange(self.effective_bits, dtype=np.int64))
+        return ((projections > 0) * weights).sum(axis=2)
+
+    def candidates(self, row):
+        """Indices des utilisateurs partageant un seau avec `row`, les plus fréquents en premier."""
+        query_hashes = self._hash(row)[0]
+        found = []
+        for table in range(self.num_tables):
+            table_hashes = self.sorted_hashes[:, table]
+            low = np.searchsorted(table_hashes, query_hashes[table], side='left')
+            high = np.searchsorted(table_hashes, query_hashes[table], side='right')
+            found.append(self.order[low:high, table])
+
+        candidates, counts = np.unique(np.concatenate(found), return_counts=True)
+        if len(candidates) > self.max_candidates:
+            candidates = candidates[np.argsort(-counts, kind='stable')[:self.max_candidates]]
+        return candidates.astype(np.int32)
+
+    def query(self, matrix, user_row, k=NUM_NEIGHBORS):
+        """Retourne les k voisins approximatifs d'un utilisateur (indices, scores), au format de la table exacte."""
+        candidates = self.candidates(matrix[user_row])
+        # Les utilisateurs ajoutés depuis la construction de l'index n'y figurent pas encore
+        candidates = candidates[candidates < matrix.shape[0]]
+        scores = _cosine_scores(matrix, user_row, candidates)
+        return _top_k(candidates, scores, user_row, k)
+
+
+_lsh_index = None
+
+
+def get_lsh_index():
+    """
+    Retourne l'index LSH du modèle courant, construit à la première utilisation.
+    Il est invalidé à chaque reconstruction complète ; entre deux reconstructions, les
+    requêtes hachent la ligne à jour de l'utilisateur et reclassent sur la matrice courante.
+    """
+    global _lsh_index
+    if _lsh_index is None:
+        with _model_lock:
+            if _lsh_index is None:
+                with RECOMMENDER_BUILD_DURATION.labels("lsh").time():
+                    _lsh_index = LSHIndex().fit(_current_matrix())
+    return _lsh_index
+
+
+def _synthetic_interactions(n_users, n_items, n_clusters, likes_per_user, seed=0):
+    """
+    Génère une matrice d'interactions synthétique où chaque utilisateur aime surtout
+    des items de son groupe (structure de voisinage réaliste pour mesurer le rappel).
+    """
+    rng = np.random.default_rng(seed)
+    clusters = rng.integers(0, n_clusters, size=n_users)
+    cluster_items = rng.integers(0, n_items, size=(n_clusters, max(likes_per_user * 2, 1)))
+
+    rows = np.repeat(np.arange(n_users, dtype=np.int32), likes_per_user)
+    from_cluster = rng.random(n_users * likes_per_user) < 0.9
+    cols = np.where(
+        from_cluster,
+        cluster_items[np.repeat(clusters, likes_per_user), rng.integers(0, cluster_items.shape[1], size=len(rows))],
+        rng.integers(0, n_items, size=len(rows))
+    ).astype(np.int32)
+
+    matrix = sparse.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)), shape=(n_users, n_items))
+    matrix.data[:] = 1
+    return matrix
+
+
+def lsh_recall_report(n_users=5000, n_items=2000, n_clusters=50, likes_per_user=20, k=20,
+                      num_tables=LSH_NUM_TABLES, num_bits=None, num_queries=500, seed=0):
+    """
+    Compare le backend LSH à la recherche exacte sur des données synthétiques.
+    Retourne le rappel moyen des k voisins, le nombre moyen de candidats reclassés et les temps.
+    Un voisin approximatif compte comme trouvé si sa similarité atteint celle du k-ième voisin
+    exact, pour ne pas pénaliser les égalités de score.
+    """
+    matrix = _synthetic_interactions(n_users, n_items, n_clusters, likes_per_user, seed=seed)
+
+    start = time.perf_counter()
+    exact_indices, exact_scores = build_neighbor_index(matrix, k=k)
+    exact_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = LSHIndex(num_tables=num_tables, num_bits=num_bits, seed=seed).fit(matrix)
+    fit_seconds = time.perf_counter() - start
+
+    query_rows = np.random.default_rng(seed).choice(n_users, size=min(num_queries, n_users), replace=False)
+    recalls, candidate_counts = [], []
+    start = time.perf_counter()
+    for user_row in query_rows:
+        _, approximate_scores = index.query(matrix, user_row, k)
+        expected = exact_scores[user_row][exact_indices[user_row] >= 0]
+        if len(expected):
+            recalls.append(np.count_nonzero(approximate_scores >= expected[-1]) / len(expected))
+        candidate_counts.append(len(index.candidates(matrix[user_row])))
+    query_seconds = time.perf_counter() - start
+
+    return {
+        'n_users': n_users,
+        'num_tables': num_tables,
+        'num_bits': index.effective_bits,
+        'k': k,
+        'recall_at_k': float(np.mean(recalls)) if recalls else 0.0,
+        'mean_candidates': float(np.mean(candidate_counts)),
+        'exact_build_seconds': exact_seconds,
+        'lsh_fit_seconds': fit_seconds,
+        'lsh_query_ms': 1000 * query_seconds / max(len(query_rows), 1),
+    }
+
+
+# --- Factorisation matricielle (ALS implicite) ---
+
+def _als_solve_rows(matrix, fixed_factors, gram, alpha=ALS_ALPHA, rows=None):
+    """
+    Demi-itération d'ALS implicite (Hu, Koren & Volinsky) : pour chaque ligne de la matrice
+    de likes, résout (G + Yᵢᵀ(Cᵢ - I)Yᵢ) x = Yᵢᵀ Cᵢ pᵢ, où G = YᵀY + λI est précalculée.
+    Le coût par ligne ne dépend que de son nombre de likes et du nombre de facteurs.
+    """
+    rows = range(matrix.shape[0]) if rows is None else rows
+    solved = np.zeros((len(rows), fixed_factors.shape[1]), dtype=np.float64)
+    for offset, row in enumerate(rows):
+        row_start, row_end = matrix.indptr[row], matrix.indptr[row + 1]
+        if row_start == row_end:
+            continue
+        factors = np.asarray(fixed_factors[matrix.indices[row_start:row_end]], dtype=np.float64)
+        confidence = alpha * np.asarray(matrix.data[row_start:row_end], dtype=np.float64)
+        system = gram + (factors.T * confidence) @ factors
+        solved[offset] = np.linalg.solve(system, factors.T @ (1.0 + confidence))
+    return solved
+
+
+def _als_gram(factors, regularization=ALS_REGULARIZATION):
+    """Matrice YᵀY + λI partagée par toutes les lignes d'une demi-itération."""
+    factors = np.asarray(factors, dtype=np.float64)
+    return factors.T @ factors + regularization * np.eye(factors.shape[1])
+
+
+@RECOMMENDER_BUILD_DURATION.labels("als").time()
+def train_als(matrix, factors=ALS_FACTORS, iterations=ALS_ITERATIONS,
+              regularization=ALS_REGULARIZATION, alpha=ALS_ALPHA, seed=0):
+    """
+    Entraîne une factorisation ALS implicite sur les likes de la matrice d'interactions.
+    Retourne l'état du modèle : embeddings utilisateurs et items (float32) et la matrice
+    de Gram des items, utilisée pour projeter les utilisateurs modifiés après l'entraînement.
+    """
+    liked_matrix = (matrix == 1).astype(np.float64).tocsr()
+    liked_matrix_t = liked_matrix.T.tocsr()
+    rng = np.random.default_rng(seed)
+    user_factors = rng.normal(scale=0.01, size=(matrix.shape[0], factors))
+    item_factors = rng.normal(scale=0.01, size=(matrix.shape[1], factors))
+
+    for _ in range(iterations):
+        user_factors = _als_solve_rows(liked_matrix, item_factors, _als_gram(item_factors, regularization), alpha)
+        item_factors = _als_solve_rows(liked_matrix_t, user_factors, _als_gram(user_factors, regularization), alpha)
+
+    return {
+        'user_factors': user_factors.astype(np.float32),
+        'item_factors': item_factors.astype(np.float32),
+        'item_gram': _als_gram(item_factors, regularization),
+        'dirty_rows': set(),
+    }
+
+
+def _als_fold_in_rows(als_state, matrix, rows):
+    """
+    Recalcule les embeddings de certains utilisateurs à partir de leurs likes actuels
+    (étape utilisateur d'ALS, embeddings items fixés) et retourne la table mise à jour.
+    """
+    rows = sorted(rows)
+    liked_matrix = (matrix == 1).astype(np.float64).tocsr()
+    user_factors = np.zeros((matrix.shape[0], als_state['item_factors'].shape[1]), dtype=np.float32)
+    user_factors[:len(als_state['user_factors'])] = als_state['user_factors'][:matrix.shape[0]]
+    # Les items apparus depuis l'entraînement n'ont pas d'embedding
+    liked_matrix = liked_matrix[:, :als_state['item_factors'].shape[0]].tocsr()
+    user_factors[rows] = _als_solve_rows(liked_matrix, als_state['item_factors'], als_state['item_gram'], rows=rows)
+    return user_factors
+
+
+_als_state = None
+
+
+def get_als_model():
+    """
+    Retourne l'état ALS courant, ou None s'il n'a été ni chargé d'un snapshot ni entraîné par
+    train_als_model : l'entraînement n'est jamais lancé pendant une requête.
+    """
+    return _als_state
+
+
+def train_als_model():
+    """Réentraîne les embeddings ALS sur la matrice courante (à lancer hors ligne, puis save_snapshot)."""
+    global _als_state
+    with _model_lock:
+        matrix = _current_matrix()
+    new_state = train_als(matrix)
+    with _model_lock:
+        _als_state = new_state
+
+
+def _als_user_vector(als_state, user_row):
+    """
+    Embedding d'un utilisateur : lu dans la table entraînée, ou projeté à partir de ses likes
+    actuels s'il a été modifié (ou créé) depuis l'entraînement.
+    """
+    if user_row < len(als_state['user_factors']) and user_row not in als_state['dirty_rows']:
+        return np.asarray(als_state['user_factors'][user_row])
+
+    liked_columns = _liked_columns(user_row)
+    liked_columns = liked_columns[liked_columns < als_state['item_factors'].shape[0]]
+    row_matrix = sparse.csr_matrix(
+        (np.ones(len(liked_columns)), liked_columns, [0, len(liked_columns)]),
+        shape=(1, als_state['item_factors'].shape[0])
+    )
+    return _als_solve_rows(row_matrix, als_state['item_factors'], als_state['item_gram'])[0].astype(np.float32)
+
+
+# Chargement du modèle : snapshot binaire s'il existe, sinon construction à partir des fichiers de données
+_snapshot_model = load_snapshot()
+_install_model(_snapshot_model if _snapshot_model is not None else load_model_from_files())
+del _snapshot_model
+if COLLABORATIVE_ENGINE == "als" and _als_state is None:
+    logger.warning("Moteur ALS demandé sans facteurs entraînés : filtrage par utilisateurs utilisé à la place "
+                   "(générez le snapshot avec --build-snapshot --with-als).")
 
 # --- Fonctions de Recommandation ---
 
-def recommend_by_user_similarity(target_user_id, num_recommendations=5):
+def _liked_columns(user_row):
+    """Retourne les indices de colonnes des items aimés (valeur 1) par un utilisateur."""
+    columns, values = _current_row(user_row)
+    return columns[values == 1]
+
+def _neighbors_of(user_row, backend):
+    """Voisins (indices, scores) d'un utilisateur selon le backend choisi ("exact" ou "lsh")."""
+    if backend == "exact":
+        return neighbor_indices[user_row], neighbor_scores[user_row]
+    if backend == "lsh":
+        return get_lsh_index().query(current_rows, user_row, NUM_NEIGHBORS)
+    raise ValueError(f"Backend de voisinage inconnu : {backend}")
+
+def recommend_by_user_similarity(target_user_id, num_recommendations=5, backend=None):
     """
     Recommande des items à un utilisateur cible en utilisant le filtrage collaboratif.
+    Seuls les k voisins de l'utilisateur sont parcourus : ceux de la table précalculée
+    (backend "exact") ou ceux trouvés par l'index LSH (backend "lsh").
+    Par défaut, le backend est celui de NEIGHBOR_BACKEND.
     """
-    if user_item_matrix.empty or target_user_id not in user_item_matrix.index:
+    if target_user_id not in user_index:
         return []
 
-    # Obtenir les utilisateurs similaires, exclure l'utilisateur cible lui-même
-    similar_users = user_similarity_df[target_user_id].sort_values(ascending=False)
-    similar_users = similar_users.drop(target_user_id, errors='ignore') # Exclure l'utilisateur lui-même
+    target_row = user_index[target_user_id]
+    similar_rows, similar_scores = _neighbors_of(target_row, backend or NEIGHBOR_BACKEND)
 
     # Identifier les items déjà aimés par l'utilisateur cible
-    user_liked_items = user_item_matrix.loc[target_user_id][user_item_matrix.loc[target_user_id] == 1].index
+    user_liked_columns = set(_liked_columns(target_row).tolist())
 
     recommendations = []
-    for similar_user_id, similarity_score in similar_users.items():
-        if similarity_score > 0:
-            similar_user_liked_items = user_item_matrix.loc[similar_user_id][user_item_matrix.loc[similar_user_id] == 1].index
-            new_recommendations = [item for item in similar_user_liked_items if item not in user_liked_items]
-
-            for item_id in new_recommendations:
-                item_info = items_df[items_df['item_id'] == item_id]
-                if not item_info.empty:
-                    item_info = item_info.iloc[0]
-                    recommendations.append({
-                        'item_id': item_id,
-                        'title': item_info['title'],
-                        'genre': item_info['genre'],
-                        'reason': f"Aimé par un utilisateur similaire (ID: {similar_user_id}, Similarité: {similarity_score:.2f})"
-                    })
-        if len(recommendations) >= num_recommendations * 2: # Prendre plus pour filtrer les doublons
+    seen_columns = set()
+    for similar_row, similarity_score in zip(similar_rows, similar_scores):
+        if similar_row < 0:
             break
+        similar_user_id = int(user_ids[similar_row])
+
+        for column in _liked_columns(similar_row).tolist():
+            if column in user_liked_columns or column in seen_columns:
+                continue
+            seen_columns.add(column)
 
-    unique_recommendations = pd.DataFrame(recommendations).drop_duplicates(subset=['item_id']).head(num_recommendations)
-    return unique_recommendations.to_dict(orient='records')
+            position = column_catalog_positions[column]
+            if position >= 0:
+                recommendations.append(item_catalog.record(
+                    position,
+                    f"Aimé par un utilisateur similaire (ID: {similar_user_id}, Similarité: {similarity_score:.2f})"
+                ))
+                if len(recommendations) >= num_recommendations:
+                    return recommendations
+
+    return recommendations
 
 def recommend_by_content(target_user_id, num_recommendations=5):
     """
-    Recommande des items à un utilisateur cible en utilisant le filtrage basé sur le contenu (genres).
+    Recommande des items à un utilisateur cible en utilisant le filtrage basé sur le contenu.
+    Le profil de l'utilisateur est la moyenne des vecteurs de contenu (genres, mots du titre)
+    des items qu'il a aimés ; tout le catalogue est classé par un seul produit matrice creuse x vecteur.
     """
-    if users_df.empty or items_df.empty or target_user_id not in users_df['user_id'].values:
+    if len(item_catalog) == 0 or target_user_id not in user_index:
         return []
 
-    user_liked_items_ids = users_df[(users_df['user_id'] == target_user_id) & (users_df['liked'] == 1)]['item_id'].tolist()
+    liked_positions = column_catalog_positions[_liked_columns(user_index[target_user_id])]
+    liked_positions = np.unique(liked_positions[liked_positions >= 0])
 
-    if not user_liked_items_ids:
+    if len(liked_positions) == 0:
         return []
 
-    liked_items_info = items_df[items_df['item_id'].isin(user_liked_items_ids)]
-    preferred_genres = liked_items_info['genre'].unique()
+    features = item_catalog.features
+    profile = np.asarray(features[liked_positions].mean(axis=0), dtype=np.float32).ravel()
+    scores = features @ profile
+    scores[liked_positions] = 0
 
-    unliked_items = items_df[~items_df['item_id'].isin(user_liked_items_ids)]
+    top_n = min(num_recommendations, np.count_nonzero(scores > 0))
+    if top_n == 0:
+        return []
+    positions = np.argpartition(-scores, top_n - 1)[:top_n]
+    positions = positions[np.lexsort((positions, -scores[positions]))]
 
+    preferred_genres = {genre for position in liked_positions.tolist() for genre in item_catalog.genres_of(position)}
     recommendations = []
-    for genre in preferred_genres:
-        genre_items = unliked_items[unliked_items['genre'] == genre]
-        for _, row in genre_items.iterrows():
-            if len(recommendations) < num_recommendations:
-                recommendations.append({
-                    'item_id': row['item_id'],
-                    'title': row['title'],
-                    'genre': row['genre'],
-                    'reason': f"Similaire à vos préférences de genre ({genre})"
-                })
-            else:
-                break
-        if len(recommendations) >= num_recommendations:
-            break
+    for position in positions.tolist():
+        shared_genres = [genre for genre in item_catalog.genres_of(position) if genre in preferred_genres]
+        if shared_genres:
+            reason = f"Similaire à vos préférences de genre ({', '.join(shared_genres)})"
+        else:
+            reason = "Similaire au contenu des items que vous avez aimés"
+        recommendations.append(item_catalog.record(position, reason))
+
+    return recommendations
+
+def recommend_by_item_similarity(target_user_id, num_recommendations=5):
+    """
+    Recommande des items à un utilisateur cible en utilisant le filtrage collaboratif item-item.
+    Le score d'un item est la somme de ses similarités avec les items aimés par l'utilisateur,
+    lue dans les listes d'items similaires précalculées : le coût dépend de la taille de
+    l'historique de l'utilisateur, pas du nombre d'utilisateurs.
+    """
+    if target_user_id not in user_index:
+        return []
+
+    liked_columns = _liked_columns(user_index[target_user_id])
+    # Les items apparus depuis le dernier calcul des listes n'ont pas encore de voisins
+    liked_columns = liked_columns[liked_columns < item_neighbor_indices.shape[0]]
+    if len(liked_columns) == 0:
+        return []
 
+    candidates = item_neighbor_indices[liked_columns].ravel()
+    contributions = item_neighbor_scores[liked_columns].ravel()
+    sources = np.repeat(liked_columns, item_neighbor_indices.shape[1])
+    valid = candidates >= 0
+    candidates, contributions, sources = candidates[valid], contributions[valid], sources[valid]
+
+    scores = np.zeros(len(item_ids), dtype=np.float32)
+    np.add.at(scores, candidates, contributions)
+    scores[liked_columns] = 0
+
+    top_n = min(num_recommendations, np.count_nonzero(scores))
+    if top_n == 0:
+        return []
+    columns = np.argpartition(-scores, top_n - 1)[:top_n]
+    columns = columns[np.lexsort((columns, -scores[columns]))]
+
+    # Item aimé qui contribue le plus à chaque recommandation, pour l'explication
+    best_sources = {}
+    for candidate, contribution, source in zip(candidates.tolist(), contributions.tolist(), sources.tolist()):
+        if candidate not in best_sources or contribution > best_sources[candidate][0]:
+            best_sources[candidate] = (contribution, source)
+
+    recommendations = []
+    for column in columns.tolist():
+        position = column_catalog_positions[column]
+        if position < 0:
+            continue
+        source_position = column_catalog_positions[best_sources[column][1]]
+        source_title = str(item_catalog.titles[source_position]) if source_position >= 0 else f"item {item_ids[best_sources[column][1]]}"
+        recommendations.append(item_catalog.record(
+            position,
+            f"Similaire à {source_title} que vous avez aimé (Score: {scores[column]:.2f})"
+        ))
     return recommendations
 
-def get_recommendations(target_user_id: int, num_recommendations_total: int = 5):
+def recommend_by_als(target_user_id, num_recommendations=5):
+    """
+    Recommande des items à un utilisateur cible par factorisation matricielle (ALS implicite).
+    Le score de tous les items est un seul produit entre la matrice des embeddings items et
+    l'embedding de l'utilisateur ; les items déjà aimés sont masqués et le top-N est extrait
+    avec argpartition.
+    """
+    als_state = get_als_model()
+    if als_state is None:
+        # Pas de facteurs entraînés (snapshot construit sans --with-als) : filtrage par utilisateurs
+        return recommend_by_user_similarity(target_user_id, num_recommendations)
+    if target_user_id not in user_index:
+        return []
+
+    user_row = user_index[target_user_id]
+    scores = np.asarray(als_state['item_factors']) @ _als_user_vector(als_state, user_row)
+
+    liked_columns = _liked_columns(user_row)
+    scores[liked_columns[liked_columns < len(scores)]] = -np.inf
+    top_n = min(num_recommendations, np.count_nonzero(np.isfinite(scores)))
+    if top_n == 0:
+        return []
+    columns = np.argpartition(-scores, top_n - 1)[:top_n]
+    columns = columns[np.lexsort((columns, -scores[columns]))]
+
+    recommendations = []
+    for column in columns.tolist():
+        position = column_catalog_positions[column]
+        if position >= 0:
+            recommendations.append(item_catalog.record(position, f"Recommandé par factorisation matricielle (Score: {scores[column]:.2f})"))
+    return recommendations
+
+@RECOMMENDER_SCORE_DURATION.labels("score_items").time()
+def score_items(liked_item_ids, candidate_item_ids):
+    """
+    Score item-item de candidats externes (par exemple des films proposés par une API) :
+    somme des similarités de chaque candidat avec les items aimés, lue dans les listes d'items
+    similaires précalculées. Les identifiants inconnus du modèle ont un score nul.
+    Retourne un tableau float32 aligné sur candidate_item_ids.
+    """
+    scores = np.zeros(len(candidate_item_ids), dtype=np.float32)
+    liked_columns = item_index.lookup(liked_item_ids)
+    liked_columns = liked_columns[(liked_columns >= 0) & (liked_columns < item_neighbor_indices.shape[0])]
+    if len(liked_columns) == 0 or len(candidate_item_ids) == 0:
+        return scores
+
+    column_scores = np.zeros(len(item_ids), dtype=np.float32)
+    neighbors = item_neighbor_indices[liked_columns].ravel()
+    contributions = item_neighbor_scores[liked_columns].ravel()
+    valid = neighbors >= 0
+    np.add.at(column_scores, neighbors[valid], contributions[valid])
+
+    candidate_columns = item_index.lookup(candidate_item_ids)
+    known = candidate_columns >= 0
+    scores[known] = column_scores[candidate_columns[known]]
+    return scores
+
+def get_recommendations(target_user_id: int, num_recommendations_total: int = 5, engine: str = None):
     """
     Combine les recommandations du filtrage collaboratif et du filtrage basé sur le contenu.
     C'est la fonction principale qui sera appelée par l'API.
+    Le moteur collaboratif ("user", "item" ou "als") est celui de COLLABORATIVE_ENGINE par défaut.
     """
     # S'assurer que les dataframes ne sont pas vides avant de tenter des opérations
-    if user_item_matrix.empty or items_df.empty or users_df.empty:
+    if len(user_ids) == 0 or len(item_catalog) == 0:
         return [] # Retourne une liste vide si les données ne sont pas chargées
 
-    collaborative_recommendations = recommend_by_user_similarity(target_user_id, num_recommendations=num_recommendations_total * 2)
-    content_based_recommendations = recommend_by_content(target_user_id, num_recommendations=num_recommendations_total * 2)
+    engine = engine or COLLABORATIVE_ENGINE
+    if engine not in COLLABORATIVE_ENGINES:
+        raise ValueError(f"Moteur collaboratif inconnu : {engine}")
+
+    with RECOMMENDER_SCORE_DURATION.labels(engine).time():
+        collaborative_recommendations = COLLABORATIVE_ENGINES[engine](target_user_id, num_recommendations=num_recommendations_total * 2)
+    with RECOMMENDER_SCORE_DURATION.labels("content").time():
+        content_based_recommendations = recommend_by_content(target_user_id, num_recommendations=num_recommendations_total * 2)
 
     combined_recs = []
     seen_item_ids = set()
@@ -128,13 +1473,116 @@ def get_recommendations(target_user_id: int, num_recommendations_total: int = 5)
             combined_recs.append(rec)
             seen_item_ids.add(rec['item_id'])
 
-    user_liked_items_ids = users_df[(users_df['user_id'] == target_user_id) & (users_df['liked'] == 1)]['item_id'].tolist()
+    user_liked_items_ids = set(item_ids[_liked_columns(user_index[target_user_id])].tolist()) if target_user_id in user_index else set()
     final_recommendations = [rec for rec in combined_recs if rec['item_id'] not in user_liked_items_ids]
 
     return final_recommendations[:num_recommendations_total]
 
+COLLABORATIVE_ENGINES = {
+    "user": recommend_by_user_similarity,
+    "item": recommend_by_item_similarity,
+    "als": recommend_by_als,
+}
+
+def _neighbor_weight_matrix(user_rows):
+    """
+    Construit la matrice creuse (len(user_rows), n_users) des similarités vers les k voisins
+    de chaque utilisateur du bloc.
+    """
+    block_indices = neighbor_indices[user_rows]
+    block_scores = neighbor_scores[user_rows]
+    valid = block_indices >= 0
+    rows = np.broadcast_to(np.arange(len(user_rows), dtype=np.int32)[:, None], block_indices.shape)
+    return sparse.csr_matrix(
+        (block_scores[valid], (rows[valid], block_indices[valid])),
+        shape=(len(user_rows), len(user_ids)),
+        dtype=np.float32
+    )
+
+@RECOMMENDER_SCORE_DURATION.labels("batch").time()
+def get_recommendations_batch(target_user_ids, num_recommendations_total: int = 5, chunk_size: int = BATCH_CHUNK_SIZE):
+    """
+    Calcule les recommandations pour un ensemble d'utilisateurs en une seule passe vectorisée.
+    Les utilisateurs sont scorés par blocs de `chunk_size` : score = somme des likes des voisins
+    pondérée par leur similarité, les items déjà aimés sont masqués et le top-N est extrait
+    avec argpartition. La mémoire de pointe est bornée par chunk_size x n_items.
+    Les utilisateurs sans assez de résultats collaboratifs sont complétés par le filtrage par contenu.
+    Retourne un dictionnaire {user_id: [recommandations]} au même format que get_recommendations.
+    """
+    results = {user_id: [] for user_id in target_user_ids}
+    if len(user_ids) == 0 or len(item_catalog) == 0:
+        return results
+
+    known_user_ids = [user_id for user_id in results if user_id in user_index]
+    if not known_user_ids:
+        return results
+
+    with _model_lock:
+        matrix = _current_matrix()
+    liked_matrix = (matrix == 1).astype(np.float32).tocsr()
+    n_items = matrix.shape[1]
+    top_n = min(num_recommendations_total, n_items)
+
+    for start in range(0, len(known_user_ids), chunk_size):
+        chunk_user_ids = known_user_ids[start:start + chunk_size]
+        user_rows = np.fromiter((user_index[user_id] for user_id in chunk_user_ids), dtype=np.int32, count=len(chunk_user_ids))
+
+        scores = (_neighbor_weight_matrix(user_rows) @ liked_matrix).toarray()
+        # Masquer les items déjà aimés par chaque utilisateur du bloc
+        already_liked = liked_matrix[user_rows]
+        scores[already_liked.nonzero()] = 0
+
+        if top_n == 0:
+            continue
+        candidates = np.argpartition(-scores, top_n - 1, axis=1)[:, :top_n]
+        for offset, user_id in enumerate(chunk_user_ids):
+            columns = candidates[offset]
+            column_scores = scores[offset, columns]
+            order = np.lexsort((columns, -column_scores))
+            recommendations = []
+            for column, score in zip(columns[order], column_scores[order]):
+                if score <= 0:
+                    break
+                position = column_catalog_positions[column]
+                if position >= 0:
+                    recommendations.append(item_catalog.record(position, f"Aimé par des utilisateurs similaires (Score: {score:.2f})"))
+            results[user_id] = recommendations
+
+    # Compléter avec le filtrage basé sur le contenu, comme get_recommendations
+    for user_id in known_user_ids:
+        recommendations = results[user_id]
+        if len(recommendations) >= num_recommendations_total:
+            continue
+        seen_item_ids = {rec['item_id'] for rec in recommendations}
+        for rec in recommend_by_content(user_id, num_recommendations=num_recommendations_total * 2):
+            if rec['item_id'] not in seen_item_ids:
+                recommendations.append(rec)
+                seen_item_ids.add(rec['item_id'])
+        del recommendations[num_recommendations_total:]
+
+    return results
+
 # Exemple d'appel pour vérifier (non utilisé par l'API, juste pour tester le fichier)
+# Usage : python app/recommender.py [--build-snapshot [--with-als] | --lsh-report]
+# (RECOMMENDER_ITEMS_PATH et RECOMMENDER_INTERACTIONS_PATH : fichiers CSV ou Parquet à charger)
 if __name__ == "__main__":
+    if "--build-snapshot" in sys.argv:
+        # Reconstruction depuis les fichiers de données, même si un snapshot existe déjà
+        _install_model(load_model_from_files())
+        # Les facteurs ALS ne sont entraînés que sur demande (ou si le moteur ALS est configuré)
+        with_als = "--with-als" in sys.argv or COLLABORATIVE_ENGINE == "als"
+        print(f"Snapshot écrit dans {save_snapshot(with_als=with_als)}")
+        peak = peak_rss_mb()
+        if peak is not None:
+            print(f"Mémoire de pointe : {peak:.0f} Mo")
+        sys.exit(0)
+
+    if "--lsh-report" in sys.argv:
+        # Rappel du backend LSH par rapport à la recherche exacte, pour plusieurs réglages
+        for num_tables, num_bits in [(4, 4), (16, 6), (16, 8), (32, 7), (32, 8)]:
+            print(lsh_recall_report(num_tables=num_tables, num_bits=num_bits))
+        sys.exit(0)
+
     print("Test des fonctions de recommandation dans recommender.py")
     recs = get_recommendations(1)
     print(f"Recommandations pour l'utilisateur 1: {recs}")
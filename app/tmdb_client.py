@@ -0,0 +1,183 @@
+# app/tmdb_client.py
+
+import asyncio
+import random
+import logging
+import time
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+import httpx
+from fastapi import HTTPException
+
+from limiter import INTERACTIVE, LimiterBusy, UpstreamLimiter
+from metrics import UPSTREAM_CALLS, UPSTREAM_RETRIES, observe_upstream, record_timing, route_template
+
+logger = logging.getLogger(__name__)
+
+TMDB_BASE_URL = "https://api.themoviedb.org/3"
+
+# Statuts pour lesquels une nouvelle tentative a un sens (limite de débit, erreurs serveur)
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Convertit un en-tête Retry-After (secondes ou date HTTP) en nombre de secondes d'attente."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class TMDBClient:
+    """
+    Client HTTP asynchrone partagé par toute l'application pour les appels à TMDB.
+    Une seule instance de httpx.AsyncClient est gardée pendant toute la durée de vie de l'API :
+    les connexions keep-alive sont réutilisées (pas de nouvelle poignée de main TLS à chaque appel).
+    Les erreurs transitoires sont retentées de manière asynchrone avec un backoff exponentiel
+    et du jitter, en respectant l'en-tête Retry-After des réponses 429, dans la limite d'un
+    délai global par appel.
+    Si un limiteur est fourni, chaque tentative y prend une place (jeton + appel simultané) :
+    une réponse 429 suspend alors tous les appels, pas seulement celui qui l'a reçue.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str = TMDB_BASE_URL,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        timeout: float = 10.0,
+        max_retries: int = 5,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        deadline: float = 20.0,
+        limiter: Optional[UpstreamLimiter] = None,
+    ):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive_connections)
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.deadline = deadline
+        self.limiter = limiter
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def start(self):
+        """Crée le client HTTP partagé (appelé au démarrage de l'application)."""
+        if self._client is None:
+            self._client = httpx.AsyncClient(base_url=self.base_url, limits=self.limits, timeout=self.timeout)
+
+    async def close(self):
+        """Ferme le client HTTP partagé et ses connexions (appelé à l'arrêt de l'application)."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _backoff(self, attempt: int) -> float:
+        """Délai avant la tentative suivante : backoff exponentiel avec jitter complet."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def _send(self, path: str, query: Dict, timeout: float) -> httpx.Response:
+        """Un GET mesuré : durée et résultat de la tentative par route TMDB (identifiants remplacés par {id})."""
+        operation = route_template(path)
+        start = time.perf_counter()
+        try:
+            response = await self._client.get(path, params=query, timeout=timeout)
+        except httpx.TransportError:
+            observe_upstream("tmdb", operation, "transport_error", time.perf_counter() - start)
+            raise
+        outcome = "ok" if response.status_code < 400 else f"http_{response.status_code}"
+        observe_upstream("tmdb", operation, outcome, time.perf_counter() - start)
+        return response
+
+    async def _get(self, path: str, query: Dict, timeout: float, priority: int, max_wait: Optional[float]) -> httpx.Response:
+        """Un GET, après avoir obtenu une place auprès du limiteur s'il y en a un."""
+        if self.limiter is None:
+            return await self._send(path, query, timeout)
+        start = time.perf_counter()
+        try:
+            await self.limiter.acquire(priority, max_wait)
+        finally:
+            record_timing("tmdb_wait", time.perf_counter() - start)
+        try:
+            return await self._send(path, query, timeout)
+        finally:
+            self.limiter.release()
+
+    async def get_json(
+        self,
+        path: str,
+        params: Optional[Dict] = None,
+        deadline: Optional[float] = None,
+        priority: int = INTERACTIVE,
+        max_wait: Optional[float] = None,
+    ) -> Dict:
+        """
+        Effectue un GET sur l'API TMDB et retourne le JSON de la réponse.
+        Lève une HTTPException 404 si la ressource n'existe pas, une HTTPException 503 si le
+        limiteur n'a pas accordé de place en `max_wait` secondes (ou avant le délai global),
+        et une HTTPException 500 si l'appel échoue encore après les retentatives ou le délai global.
+        """
+        if self._client is None:
+            await self.start()
+
+        query = {"api_key": self.api_key}
+        if params:
+            query.update(params)
+
+        loop = asyncio.get_running_loop()
+        deadline_at = loop.time() + (deadline if deadline is not None else self.deadline)
+        last_error = "délai dépassé"
+
+        for attempt in range(self.max_retries):
+            remaining = deadline_at - loop.time()
+            if remaining <= 0:
+                break
+
+            retry_after = None
+            wait_budget = remaining if max_wait is None else min(max_wait, remaining)
+            try:
+                response = await self._get(path, query, min(self.timeout, remaining), priority, wait_budget)
+            except LimiterBusy:
+                UPSTREAM_CALLS.labels("tmdb", route_template(path), "shed").inc()
+                logger.debug("Appel TMDB %s abandonné : limite de requêtes atteinte", path)
+                raise HTTPException(status_code=503, detail="Limite de requêtes TMDB atteinte, réessayez plus tard.")
+            except httpx.TransportError as e:
+                last_error = repr(e)
+            else:
+                if response.status_code < 400:
+                    return response.json()
+                if response.status_code == 404:
+                    raise HTTPException(status_code=404, detail="Ressource introuvable sur TMDB.")
+                last_error = f"statut HTTP {response.status_code}"
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    break
+                if response.status_code == 429:
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                    if self.limiter is not None:
+                        self.limiter.pause(retry_after if retry_after is not None else self._backoff(attempt))
+
+            if attempt == self.max_retries - 1:
+                break
+            delay = retry_after if retry_after is not None else self._backoff(attempt)
+            if loop.time() + delay >= deadline_at:
+                break
+            UPSTREAM_RETRIES.labels("tmdb", route_template(path)).inc()
+            logger.debug("Tentative %d échouée pour %s (%s), nouvelle tentative dans %.2fs", attempt + 1, path, last_error, delay)
+            await asyncio.sleep(delay)
+
+        logger.warning("Abandon de l'appel TMDB %s : %s", path, last_error)
+        raise HTTPException(status_code=500, detail=f"Erreur lors de la communication avec l'API TMDB: {last_error}")
@@ -0,0 +1,189 @@
+# bench/fake_firestore.py
+
+import asyncio
+import copy
+import functools
+import itertools
+import sys
+import types
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+
+class FakeSnapshot:
+    """Instantané d'un document (même interface que DocumentSnapshot)."""
+
+    def __init__(self, reference, data: Optional[Dict]):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = copy.deepcopy(data)
+
+    def to_dict(self):
+        return copy.deepcopy(self._data)
+
+
+class FakeDocumentReference:
+    def __init__(self, db, collection: str, doc_id: str):
+        self._db = db
+        self.collection_name = collection
+        self.id = doc_id
+        self.path = f"{collection}/{doc_id}"
+
+    async def get(self, transaction=None):
+        await self._db._round_trip("reads")
+        return self._db._snapshot(self)
+
+    async def set(self, data: Dict):
+        await self._db._round_trip("writes")
+        self._db._write(self, data)
+
+    async def update(self, data: Dict):
+        await self._db._round_trip("writes")
+        self._db._update(self, data)
+
+
+class FakeQuery:
+    def __init__(self, db, collection: str, filters=(), limit_count: Optional[int] = None):
+        self._db = db
+        self._collection = collection
+        self._filters = tuple(filters)
+        self._limit = limit_count
+
+    def where(self, field: str, op: str, value: Any):
+        if op != "==":
+            raise NotImplementedError(f"Opérateur non supporté par le Firestore de test : {op}")
+        return FakeQuery(self._db, self._collection, self._filters + ((field, value),), self._limit)
+
+    def limit(self, count: int):
+        return FakeQuery(self._db, self._collection, self._filters, count)
+
+    def _matches(self) -> List[FakeSnapshot]:
+        results = []
+        for doc_id, data in self._db._collections.get(self._collection, {}).items():
+            if all(data.get(field) == value for field, value in self._filters):
+                results.append(FakeSnapshot(FakeDocumentReference(self._db, self._collection, doc_id), data))
+                if self._limit is not None and len(results) >= self._limit:
+                    break
+        return results
+
+    async def get(self):
+        await self._db._round_trip("queries")
+        return self._matches()
+
+    async def stream(self):
+        await self._db._round_trip("queries")
+        for snapshot in self._matches():
+            yield snapshot
+
+
+class FakeCollection(FakeQuery):
+    def document(self, doc_id: Optional[str] = None):
+        if doc_id is None:
+            doc_id = f"doc{next(self._db._ids)}"
+        return FakeDocumentReference(self._db, self._collection, doc_id)
+
+
+class FakeTransaction:
+    """Transaction : les écritures sont appliquées ensemble à la fin de la fonction transactionnelle."""
+
+    def __init__(self, db):
+        self._db = db
+        self._writes = []
+
+    def set(self, reference, data: Dict):
+        self._writes.append(("set", reference, data))
+
+    def update(self, reference, data: Dict):
+        self._writes.append(("update", reference, data))
+
+    async def _commit(self):
+        await self._db._round_trip("commits")
+        for kind, reference, data in self._writes:
+            if kind == "update":
+                self._db._update(reference, data)
+            else:
+                self._db._write(reference, data)
+        self._writes = []
+
+
+def async_transactional(func):
+    """Équivalent de firestore.async_transactional pour le Firestore en mémoire."""
+    @functools.wraps(func)
+    async def wrapper(transaction, *args, **kwargs):
+        result = await func(transaction, *args, **kwargs)
+        await transaction._commit()
+        return result
+    return wrapper
+
+
+class FakeFirestore:
+    """
+    Firestore asynchrone en mémoire, limité aux appels utilisés par app/main.py.
+    Chaque opération attend `latency` secondes (aller-retour réseau simulé) et est comptée
+    par type (lectures, écritures, requêtes, commits).
+    """
+
+    def __init__(self, latency: float = 0.005):
+        self.latency = latency
+        self.calls = Counter()
+        self._collections: Dict[str, Dict[str, Dict]] = {}
+        self._ids = itertools.count(1)
+
+    async def _round_trip(self, kind: str, count: int = 1):
+        self.calls[kind] += count
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+
+    def _snapshot(self, reference):
+        return FakeSnapshot(reference, self._collections.get(reference.collection_name, {}).get(reference.id))
+
+    def _write(self, reference, data: Dict):
+        self._collections.setdefault(reference.collection_name, {})[reference.id] = copy.deepcopy(data)
+
+    def _update(self, reference, data: Dict):
+        self._collections.setdefault(reference.collection_name, {}).setdefault(reference.id, {}).update(copy.deepcopy(data))
+
+    def collection(self, name: str):
+        return FakeCollection(self, name)
+
+    def transaction(self):
+        return FakeTransaction(self)
+
+    async def get_all(self, references):
+        references = list(references)
+        await self._round_trip("reads", len(references))
+        for reference in references:
+            yield self._snapshot(reference)
+
+    def seed(self, collection: str, doc_id: str, data: Dict):
+        """Ajoute un document sans latence ni comptage (préparation des données)."""
+        self._write(FakeDocumentReference(self, collection, doc_id), data)
+
+
+def install_fake_firebase(db: FakeFirestore):
+    """
+    Remplace les modules firebase_admin par des modules qui renvoient `db` :
+    app/main.py peut alors être importé sans compte de service ni accès réseau.
+    """
+    firebase_admin = types.ModuleType("firebase_admin")
+    firebase_admin.initialize_app = lambda *args, **kwargs: None
+
+    credentials = types.ModuleType("firebase_admin.credentials")
+    credentials.Certificate = lambda path: path
+
+    firestore = types.ModuleType("firebase_admin.firestore")
+    firestore.async_transactional = async_transactional
+
+    firestore_async = types.ModuleType("firebase_admin.firestore_async")
+    firestore_async.client = lambda: db
+
+    firebase_admin.credentials = credentials
+    firebase_admin.firestore = firestore
+    firebase_admin.firestore_async = firestore_async
+    sys.modules.update({
+        "firebase_admin": firebase_admin,
+        "firebase_admin.credentials": credentials,
+        "firebase_admin.firestore": firestore,
+        "firebase_admin.firestore_async": firestore_async,
+    })
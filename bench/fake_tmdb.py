@@ -0,0 +1,136 @@
+# bench/fake_tmdb.py
+
+import asyncio
+import random
+import threading
+import time
+import zlib
+from collections import Counter
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# Catalogue synthétique : identifiants de films de 1 à CATALOG_SIZE
+CATALOG_SIZE = 50000
+TITLE_WORDS = [
+    "amour", "nuit", "guerre", "ville", "ombre", "retour", "dernier", "secret", "voyage", "monde",
+    "étoile", "silence", "royaume", "mémoire", "tempête", "héritage", "frontière", "lumière", "piège", "destin",
+]
+
+
+def _rng(*seed):
+    """Générateur déterministe : la même requête renvoie toujours la même réponse."""
+    return random.Random(zlib.crc32(repr(seed).encode()))
+
+
+def movie_title(movie_id: int) -> str:
+    rng = _rng("title", movie_id)
+    return " ".join(rng.sample(TITLE_WORDS, 2)).capitalize() + f" {movie_id}"
+
+
+def movie_summary(movie_id: int) -> dict:
+    """Film tel qu'il apparaît dans les listes TMDB (recherche, recommandations, populaires)."""
+    rng = _rng("summary", movie_id)
+    return {
+        "id": movie_id,
+        "title": movie_title(movie_id),
+        "overview": "Résumé du film " + str(movie_id),
+        "poster_path": f"/poster{movie_id}.jpg",
+        "release_date": f"{rng.randint(1970, 2025)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "popularity": round(rng.uniform(1, 500), 3),
+        "vote_average": round(rng.uniform(3, 9), 1),
+        "vote_count": rng.randint(0, 20000),
+    }
+
+
+def movie_list(seed, size: int = 20) -> dict:
+    rng = _rng("list", seed)
+    return {"page": 1, "results": [movie_summary(rng.randint(1, CATALOG_SIZE)) for _ in range(size)]}
+
+
+def create_fake_tmdb_app(latency: float = 0.05, jitter: float = 0.02, error_rate: float = 0.0, rate_limit_rate: float = 0.0):
+    """
+    API TMDB factice (préfixe /3) pour les benchmarks. Chaque réponse attend `latency`
+    secondes (± `jitter`) ; une fraction `error_rate` des appels échoue en 500 et une
+    fraction `rate_limit_rate` en 429 avec Retry-After. Les appels sont comptés par route
+    dans `app.state.calls`.
+    """
+    app = FastAPI()
+    app.state.calls = Counter()
+    app.state.latency = latency
+    app.state.jitter = jitter
+    app.state.error_rate = error_rate
+    app.state.rate_limit_rate = rate_limit_rate
+
+    @app.middleware("http")
+    async def simulate_upstream(request: Request, call_next):
+        path = request.url.path.removeprefix("/3")
+        route = "/".join("{id}" if segment.isdigit() else segment for segment in path.split("/"))
+        app.state.calls[route] += 1
+
+        delay = max(0.0, app.state.latency + random.uniform(-app.state.jitter, app.state.jitter))
+        await asyncio.sleep(delay)
+
+        draw = random.random()
+        if draw < app.state.rate_limit_rate:
+            app.state.calls["429"] += 1
+            return JSONResponse({"status_message": "Rate limited"}, status_code=429, headers={"Retry-After": "1"})
+        if draw < app.state.rate_limit_rate + app.state.error_rate:
+            app.state.calls["500"] += 1
+            return JSONResponse({"status_message": "Internal error"}, status_code=500)
+        return await call_next(request)
+
+    @app.get("/3/search/movie")
+    async def search(query: str = ""):
+        return movie_list(("search", query.casefold()))
+
+    @app.get("/3/movie/popular")
+    async def popular():
+        return movie_list("popular")
+
+    @app.get("/3/movie/{movie_id}/recommendations")
+    async def recommendations(movie_id: int):
+        return movie_list(("recommendations", movie_id))
+
+    @app.get("/3/movie/{movie_id}/watch/providers")
+    async def watch_providers(movie_id: int):
+        rng = _rng("providers", movie_id)
+        results = {}
+        for country in ("FR", "US", "DE", "GB", "ES", "IT"):
+            results[country] = {
+                "link": f"https://www.themoviedb.org/movie/{movie_id}/watch?locale={country}",
+                "flatrate": [{"provider_id": rng.randint(1, 400), "provider_name": f"Service {rng.randint(1, 20)}"}],
+            }
+        return {"id": movie_id, "results": results}
+
+    @app.get("/3/movie/{movie_id}")
+    async def details(movie_id: int):
+        if movie_id > CATALOG_SIZE:
+            return JSONResponse({"status_message": "Not found"}, status_code=404)
+        return {**movie_summary(movie_id), "runtime": 90 + movie_id % 60, "genres": [{"id": 18, "name": "Drame"}]}
+
+    return app
+
+
+class BackgroundServer:
+    """Serveur uvicorn lancé dans un thread (avec sa propre boucle d'événements) sur un port libre."""
+
+    def __init__(self, app, host: str = "127.0.0.1", port: int = 0):
+        self.server = uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning", lifespan="on"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def start(self, timeout: float = 30.0) -> str:
+        """Démarre le serveur et retourne son URL de base."""
+        self.thread.start()
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if time.monotonic() > deadline or not self.thread.is_alive():
+                raise RuntimeError("Le serveur de benchmark n'a pas démarré.")
+            time.sleep(0.01)
+        host, port = self.server.servers[0].sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
@@ -0,0 +1,342 @@
+# bench/load_test.py
+"""
+Banc de charge de l'API (app/main.py) sans TMDB ni Firebase réels.
+
+L'API est lancée dans ce processus avec un TMDB factice (serveur local, latence et taux
+d'erreurs réglables, voir fake_tmdb.py) et un Firestore en mémoire (fake_firestore.py),
+puis des scénarios de requêtes sont rejoués par des clients concurrents. Pour chaque phase
+sont affichés, par endpoint : nombre de requêtes, erreurs, débit (RPS), latences p50/p95/p99
+et appels TMDB/Firestore déclenchés (lus dans l'en-tête Server-Timing de chaque réponse),
+ainsi que les appels TMDB par route et les opérations Firestore de la phase.
+
+Exemples :
+    python bench/load_test.py
+    python bench/load_test.py --scenarios search,recommend --duration 20 --concurrency 64
+    python bench/load_test.py --tmdb-latency 0.2 --tmdb-error-rate 0.05 --cold
+    python bench/load_test.py --replay requetes.jsonl   # une requête JSON par ligne : {"method", "path", "json"}
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+import httpx
+import numpy as np
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "app"))
+
+from fake_firestore import FakeFirestore, install_fake_firebase
+from fake_tmdb import CATALOG_SIZE, TITLE_WORDS, BackgroundServer, create_fake_tmdb_app
+
+KEYSTROKE_INTERVAL = 0.12  # Délai entre deux frappes dans le scénario de recherche (secondes)
+
+# Services amont attribués à chaque requête d'après son en-tête Server-Timing
+UPSTREAM_SERVICES = ("tmdb", "firestore")
+SERVER_TIMING_ENTRY = re.compile(r'(\w+);dur=[\d.]+;desc="(\d+) appel')
+
+
+def seed_users(db: FakeFirestore, num_users: int, rng: random.Random):
+    """Crée les comptes de test (users, index des emails, favoris). Mot de passe : "bench"."""
+    password_hash = hashlib.sha256(b"bench").hexdigest()
+    for i in range(num_users):
+        user_id = f"user{i}"
+        email = f"user{i}@bench.local"
+        db.seed("users", user_id, {"username": f"user{i}", "email": email, "password_hash": password_hash})
+        db.seed("user_emails", email, {"user_id": user_id, "username": f"user{i}", "password_hash": password_hash})
+        favorites = rng.sample(range(1, CATALOG_SIZE + 1), rng.randint(0, 30))
+        db.seed("user_favorites", user_id, {"favorites": favorites})
+
+
+def boot(args):
+    """Démarre le TMDB factice et l'API ; retourne (URL de l'API, app TMDB, Firestore, module main, serveurs)."""
+    tmdb_app = create_fake_tmdb_app(args.tmdb_latency, args.tmdb_jitter, args.tmdb_error_rate, args.tmdb_rate_limit_rate)
+    tmdb_server = BackgroundServer(tmdb_app)
+    tmdb_url = tmdb_server.start()
+
+    work_dir = tempfile.mkdtemp(prefix="bench-")
+    service_account_path = os.path.join(work_dir, "service-account.json")
+    with open(service_account_path, "w") as f:
+        f.write("{}")
+    os.environ.update({
+        "TMDB_API_KEY": "bench",
+        "TMDB_BASE_URL": f"{tmdb_url}/3",
+        "FIREBASE_SERVICE_ACCOUNT_FILE": service_account_path,
+        "TMDB_METADATA_DB": os.path.join(work_dir, "tmdb_metadata.sqlite3"),
+        # En-tête Server-Timing : nombre d'appels amont de chaque requête (voir Recorder)
+        "SERVER_TIMING": "1",
+    })
+    if args.tmdb_rate_limit:
+        os.environ["TMDB_RATE_LIMIT"] = os.environ["TMDB_RATE_BURST"] = str(int(args.tmdb_rate_limit))
+
+    db = FakeFirestore(latency=args.firestore_latency)
+    seed_users(db, args.users, random.Random(args.seed))
+    install_fake_firebase(db)
+    import main
+
+    api_server = BackgroundServer(main.app)
+    api_url = api_server.start()
+    return api_url, tmdb_app, db, main, [api_server, tmdb_server]
+
+
+def reset_caches(main):
+    """
+    Vide le cache en mémoire, le stockage persistant des métadonnées TMDB et les
+    recommandations matérialisées (phase à froid).
+    """
+    main.tmdb_cache._entries.clear()
+    main.db._collections.pop("user_recommendations", None)
+    connection = main.metadata_store._connection()
+    with connection:
+        connection.execute("DELETE FROM tmdb_payloads")
+
+
+def upstream_totals():
+    """
+    Appels amont réellement effectués par l'API depuis son démarrage, par service (compteurs
+    Prometheus du processus, appels abandonnés par le limiteur exclus).
+    """
+    from metrics import UPSTREAM_CALLS
+
+    totals = Counter()
+    for metric in UPSTREAM_CALLS.collect():
+        for sample in metric.samples:
+            if sample.name.endswith("_total") and sample.labels["outcome"] != "shed":
+                totals[sample.labels["service"]] += int(sample.value)
+    return totals
+
+
+class Recorder:
+    """
+    Latences, erreurs et appels amont par endpoint pour une phase. Les appels amont d'une
+    requête sont ceux comptés dans son en-tête Server-Timing : les appels faits après l'envoi
+    des en-têtes (flux NDJSON, tâches de fond) ou pour une requête annulée n'y figurent pas.
+    """
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = Counter()
+        self.cancelled = Counter()
+        self.upstream = defaultdict(Counter)
+
+    async def request(self, client: httpx.AsyncClient, name: str, method: str, path: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, path, **kwargs)
+            failed = response.status_code >= 500
+            for service, count in SERVER_TIMING_ENTRY.findall(response.headers.get("server-timing", "")):
+                if service in UPSTREAM_SERVICES:
+                    self.upstream[name][service] += int(count)
+        except asyncio.CancelledError:
+            self.cancelled[name] += 1
+            raise
+        except httpx.HTTPError:
+            failed = True
+        self.latencies[name].append(time.perf_counter() - start)
+        if failed:
+            self.errors[name] += 1
+
+
+# --- Scénarios : une itération = une action utilisateur ---
+
+async def scenario_search(client, recorder, rng, args):
+    """Recherche au fil de la frappe : chaque frappe annule la requête précédente (comme le frontend)."""
+    query = f"{rng.choice(TITLE_WORDS)} {rng.choice(TITLE_WORDS)}"
+    previous = None
+    for length in range(3, len(query) + 1):
+        if previous is not None and not previous.done():
+            previous.cancel()
+        previous = asyncio.ensure_future(recorder.request(client, "search", "GET", f"/search/{query[:length]}", params={"providers": "cached"}))
+        await asyncio.sleep(KEYSTROKE_INTERVAL)
+    await asyncio.gather(previous, return_exceptions=True)
+
+
+async def scenario_recommend(client, recorder, rng, args):
+    await recorder.request(client, "recommend", "GET", f"/recommend/user{rng.randrange(args.users)}")
+
+
+async def scenario_favorites(client, recorder, rng, args):
+    """Ajout/retrait d'un favori, puis rafraîchissement des icônes et de la liste des favoris."""
+    user_id = f"user{rng.randrange(args.users)}"
+    await recorder.request(client, "favorites_toggle", "POST", "/favorites", json={"user_id": user_id, "movie_id": rng.randint(1, CATALOG_SIZE)})
+    await recorder.request(client, "profile", "GET", f"/profile/{user_id}")
+    await recorder.request(client, "favorites", "GET", f"/favorites/{user_id}")
+
+
+async def scenario_movie(client, recorder, rng, args):
+    # Distribution concentrée : quelques films très consultés, beaucoup de films rares
+    movie_id = min(CATALOG_SIZE, int(rng.paretovariate(1.2)))
+    await recorder.request(client, "movie", "GET", f"/movie/{movie_id}")
+
+
+async def scenario_login(client, recorder, rng, args):
+    user_number = rng.randrange(args.users)
+    await recorder.request(client, "login", "POST", "/login", json={"email": f"user{user_number}@bench.local", "password": "bench"})
+
+
+SCENARIOS = {
+    "search": scenario_search,
+    "recommend": scenario_recommend,
+    "favorites": scenario_favorites,
+    "movie": scenario_movie,
+    "login": scenario_login,
+}
+
+# Répartition du scénario "mixed" (proportion des actions utilisateur)
+MIXED_WEIGHTS = {"search": 0.35, "recommend": 0.2, "favorites": 0.15, "movie": 0.25, "login": 0.05}
+
+
+async def scenario_mixed(client, recorder, rng, args):
+    name = rng.choices(list(MIXED_WEIGHTS), weights=list(MIXED_WEIGHTS.values()))[0]
+    await SCENARIOS[name](client, recorder, rng, args)
+
+
+async def run_phase(api_url, scenario, args, replay=None):
+    """Lance `concurrency` clients pendant `duration` secondes (ou jusqu'à la fin du fichier rejoué)."""
+    recorder = Recorder()
+    deadline = time.perf_counter() + args.duration
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+
+    async with httpx.AsyncClient(base_url=api_url, timeout=60.0, limits=limits) as client:
+        async def worker(worker_id: int):
+            rng = random.Random(args.seed * 1000 + worker_id)
+            while time.perf_counter() < deadline:
+                if replay is not None:
+                    if not replay:
+                        return
+                    entry = replay.pop()
+                    await recorder.request(
+                        client, entry.get("name") or entry["path"].split("/")[1],
+                        entry.get("method", "GET"), entry["path"], json=entry.get("json")
+                    )
+                else:
+                    await scenario(client, recorder, rng, args)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[worker(i) for i in range(args.concurrency)])
+        elapsed = time.perf_counter() - start
+    return recorder, elapsed
+
+
+def summarize(phase, recorder, elapsed, tmdb_calls, firestore_calls, upstream_calls):
+    """
+    Résumé d'une phase : statistiques par endpoint et appels amont. `upstream_calls` (appels
+    effectués par service pendant la phase) sert à compter ceux qu'aucune réponse n'a attribués.
+    """
+    endpoints = {}
+    for name, latencies in sorted(recorder.latencies.items()):
+        values = np.asarray(latencies) * 1000
+        upstream = recorder.upstream[name]
+        endpoints[name] = {
+            "requests": len(values),
+            "errors": recorder.errors[name],
+            "cancelled": recorder.cancelled[name],
+            "rps": round(len(values) / elapsed, 1),
+            "p50_ms": round(float(np.percentile(values, 50)), 1),
+            "p95_ms": round(float(np.percentile(values, 95)), 1),
+            "p99_ms": round(float(np.percentile(values, 99)), 1),
+            "tmdb_calls": upstream["tmdb"],
+            "tmdb_calls_per_request": round(upstream["tmdb"] / len(values), 2),
+            "firestore_calls": upstream["firestore"],
+            "firestore_calls_per_request": round(upstream["firestore"] / len(values), 2),
+        }
+    total_requests = sum(endpoint["requests"] for endpoint in endpoints.values())
+    return {
+        "phase": phase,
+        "duration_s": round(elapsed, 2),
+        "requests": total_requests,
+        "rps": round(total_requests / elapsed, 1) if elapsed else 0.0,
+        "endpoints": endpoints,
+        "tmdb_calls": dict(tmdb_calls),
+        "tmdb_calls_per_request": round(sum(count for route, count in tmdb_calls.items() if route.startswith("/")) / max(total_requests, 1), 2),
+        "firestore_calls": dict(firestore_calls),
+        "unattributed_calls": {
+            service: upstream_calls[service] - sum(recorder.upstream[name][service] for name in endpoints)
+            for service in UPSTREAM_SERVICES
+        },
+    }
+
+
+def print_summary(summary):
+    print(f"\n=== Phase {summary['phase']} : {summary['requests']} requêtes en {summary['duration_s']} s ({summary['rps']} RPS) ===")
+    print(f"{'endpoint':<18}{'requêtes':>10}{'erreurs':>9}{'annulées':>10}{'RPS':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+          f"{'TMDB/req':>10}{'Fs/req':>8}")
+    for name, stats in summary["endpoints"].items():
+        print(f"{name:<18}{stats['requests']:>10}{stats['errors']:>9}{stats['cancelled']:>10}{stats['rps']:>9}"
+              f"{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}"
+              f"{stats['tmdb_calls_per_request']:>10}{stats['firestore_calls_per_request']:>8}")
+    print(f"Appels TMDB ({summary['tmdb_calls_per_request']} par requête) : {summary['tmdb_calls']}")
+    print(f"Opérations Firestore : {summary['firestore_calls']}")
+    print(f"Appels non attribués à une réponse (flux, tâches de fond, annulations) : {summary['unattributed_calls']}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Banc de charge de l'API avec TMDB et Firestore simulés.")
+    parser.add_argument("--scenarios", default="search,recommend,favorites,movie,login,mixed",
+                        help="Phases à exécuter, dans l'ordre (séparées par des virgules).")
+    parser.add_argument("--replay", help="Fichier JSONL de requêtes à rejouer ({\"method\", \"path\", \"json\", \"name\"}).")
+    parser.add_argument("--duration", type=float, default=10.0, help="Durée de chaque phase (secondes).")
+    parser.add_argument("--concurrency", type=int, default=32, help="Nombre de clients simultanés.")
+    parser.add_argument("--users", type=int, default=200, help="Nombre de comptes de test.")
+    parser.add_argument("--tmdb-latency", type=float, default=0.05, help="Latence moyenne du TMDB factice (secondes).")
+    parser.add_argument("--tmdb-jitter", type=float, default=0.02, help="Variation de latence du TMDB factice (secondes).")
+    parser.add_argument("--tmdb-error-rate", type=float, default=0.0, help="Fraction des appels TMDB en erreur 500.")
+    parser.add_argument("--tmdb-rate-limit-rate", type=float, default=0.0, help="Fraction des appels TMDB en erreur 429.")
+    parser.add_argument("--tmdb-rate-limit", type=float,
+                        help="Quota du limiteur TMDB de l'API (requêtes/s, TMDB_RATE_LIMIT) ; par défaut celui de l'application.")
+    parser.add_argument("--firestore-latency", type=float, default=0.005, help="Latence de chaque opération Firestore (secondes).")
+    parser.add_argument("--cold", action="store_true", help="Vider les caches TMDB avant chaque phase.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="Écrire aussi les résultats dans ce fichier JSON.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    api_url, tmdb_app, db, app_module, servers = boot(args)
+
+    replay_entries = None
+    if args.replay:
+        with open(args.replay, encoding="utf-8") as f:
+            replay_entries = [json.loads(line) for line in f if line.strip()]
+        phases = ["replay"]
+    else:
+        phases = [phase.strip() for phase in args.scenarios.split(",") if phase.strip()]
+
+    summaries = []
+    try:
+        for phase in phases:
+            if args.cold:
+                reset_caches(app_module)
+            tmdb_before, firestore_before, upstream_before = Counter(tmdb_app.state.calls), Counter(db.calls), upstream_totals()
+            scenario = scenario_mixed if phase == "mixed" else SCENARIOS.get(phase)
+            if scenario is None and phase != "replay":
+                raise SystemExit(f"Scénario inconnu : {phase} (disponibles : {', '.join(list(SCENARIOS) + ['mixed'])})")
+            replay = list(reversed(replay_entries)) if phase == "replay" else None
+            recorder, elapsed = asyncio.run(run_phase(api_url, scenario, args, replay))
+            summary = summarize(
+                phase, recorder, elapsed, tmdb_app.state.calls - tmdb_before, db.calls - firestore_before,
+                upstream_totals() - upstream_before
+            )
+            print_summary(summary)
+            summaries.append(summary)
+    finally:
+        for server in servers:
+            server.stop()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summaries, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+# bench/recommender_bench.py
+"""
+Micro-benchmarks du moteur de recommandation (app/recommender.py) sur des interactions
+synthétiques de 10^5 à 10^7 lignes.
+
+Pour chaque taille sont mesurés : construction de la matrice creuse à partir du DataFrame,
+index des voisins utilisateurs et items, entraînement ALS, latence par utilisateur de chaque
+moteur (p50/p99) et débit du mode batch, ainsi que la mémoire de pointe du processus.
+Avec --ingest, l'ingestion d'un fichier d'interactions est comparée (durée et mémoire de
+pointe, chaque méthode dans son propre processus) : read_csv complet puis
+build_interaction_matrix, ou lecture par blocs avec read_interactions (CSV, et Parquet si
+pyarrow est installé).
+
+Exemples :
+    python bench/recommender_bench.py
+    python bench/recommender_bench.py --rows 1e5,1e6,1e7 --als-iterations 5
+    python bench/recommender_bench.py --rows 1e6,1e7 --ingest
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "app"))
+# Le module charge le modèle des CSV à l'import : chemins relatifs à la racine du dépôt
+os.chdir(os.path.join(BENCH_DIR, ".."))
+
+import recommender
+
+GENRES = ["Action", "Drame", "Comédie", "Science-Fiction", "Thriller", "Animation", "Horreur", "Romance"]
+
+
+def synthetic_dataframes(num_rows: int, likes_per_user: int, seed: int):
+    """Interactions (user_id, item_id, liked) et catalogue (item_id, title, genre) synthétiques."""
+    n_users = max(num_rows // likes_per_user, 2)
+    n_items = max(n_users // 10, 1000)
+    matrix = recommender._synthetic_interactions(n_users, n_items, n_clusters=max(n_users // 200, 10),
+                                                 likes_per_user=likes_per_user, seed=seed).tocoo()
+    users_df = pd.DataFrame({
+        "user_id": matrix.row.astype(np.int32) + 1,
+        "item_id": matrix.col.astype(np.int32) + 1,
+        "liked": np.ones(matrix.nnz, dtype=np.int8),
+    })
+    rng = np.random.default_rng(seed)
+    item_ids = np.arange(1, n_items + 1, dtype=np.int32)
+    items_df = pd.DataFrame({
+        "item_id": item_ids,
+        "title": [f"Film {item_id}" for item_id in item_ids],
+        "genre": ["|".join(rng.choice(GENRES, size=rng.integers(1, 3), replace=False)) for _ in item_ids],
+    })
+    return items_df, users_df
+
+
+def timed(results, name, func, *args, **kwargs):
+    start = time.perf_counter()
+    value = func(*args, **kwargs)
+    results[name] = round(time.perf_counter() - start, 3)
+    return value
+
+
+def query_latencies(func, user_ids, **kwargs):
+    """Latences (ms) d'un moteur sur un échantillon d'utilisateurs : p50 et p99."""
+    latencies = []
+    for user_id in user_ids:
+        start = time.perf_counter()
+        func(int(user_id), **kwargs)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return round(float(np.percentile(latencies, 50)), 3), round(float(np.percentile(latencies, 99)), 3)
+
+
+def run(num_rows: int, args):
+    print(f"\n=== {num_rows:,} interactions ===")
+    results = {}
+    items_df, users_df = timed(results, "génération", synthetic_dataframes, num_rows, args.likes_per_user, args.seed)
+
+    matrix, user_ids, item_ids = timed(results, "matrice creuse", recommender.build_interaction_matrix, users_df)
+    neighbors = timed(results, "voisins utilisateurs", recommender.build_neighbor_index, matrix)
+    item_neighbors = timed(results, "voisins items", recommender.build_item_neighbor_index, matrix)
+    catalog = timed(results, "catalogue", recommender.ItemCatalog.from_dataframe, items_df)
+    als_state = timed(results, "entraînement ALS", recommender.train_als, matrix, iterations=args.als_iterations)
+    recommender._install_model({
+        "interaction_matrix": matrix, "user_ids": user_ids, "item_ids": item_ids,
+        "neighbor_indices": neighbors[0], "neighbor_scores": neighbors[1],
+        "item_neighbor_indices": item_neighbors[0], "item_neighbor_scores": item_neighbors[1],
+        "item_catalog": catalog, "als": als_state,
+    })
+    print(f"{len(user_ids):,} utilisateurs, {len(item_ids):,} items, {matrix.nnz:,} valeurs non nulles")
+    for name, seconds in results.items():
+        print(f"  {name:<24}{seconds:>10.3f} s")
+
+    sample = np.random.default_rng(args.seed).choice(user_ids, size=min(args.queries, len(user_ids)), replace=False)
+    engines = {
+        "user (exact)": (recommender.recommend_by_user_similarity, {"backend": "exact"}),
+        "user (lsh)": (recommender.recommend_by_user_similarity, {"backend": "lsh"}),
+        "item": (recommender.recommend_by_item_similarity, {}),
+        "als": (recommender.recommend_by_als, {}),
+        "contenu": (recommender.recommend_by_content, {}),
+        "combiné": (recommender.get_recommendations, {}),
+    }
+    recommender.get_lsh_index()  # Construit l'index LSH hors mesure
+    print(f"  {'moteur':<24}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, (func, kwargs) in engines.items():
+        p50, p99 = query_latencies(func, sample, **kwargs)
+        print(f"  {name:<24}{p50:>10.3f}{p99:>10.3f}")
+
+    batch_users = user_ids[:min(args.batch_users, len(user_ids))].tolist()
+    start = time.perf_counter()
+    recommender.get_recommendations_batch(batch_users)
+    elapsed = time.perf_counter() - start
+    print(f"  batch : {len(batch_users):,} utilisateurs en {elapsed:.3f} s ({len(batch_users) / elapsed:,.0f} utilisateurs/s)")
+    print(f"  mémoire de pointe : {recommender.peak_rss_mb():,.0f} Mo")
+
+    if args.ingest:
+        run_ingestion(users_df, args)
+
+
+def process_peak_mb(reset: bool = False) -> float:
+    """
+    Pic mémoire de ce processus seul (Mo). Sous Linux, ru_maxrss garde le pic du processus parent
+    après fork/exec : le pic est alors lu dans /proc/self/status (VmHWM), remis à zéro si `reset`.
+    """
+    try:
+        if reset:
+            with open("/proc/self/clear_refs", "w") as f:
+                f.write("5")
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return recommender.peak_rss_mb()
+
+
+def ingest_once(method: str, path: str, chunk_rows: int):
+    """Une ingestion (exécutée dans un sous-processus) : affiche durée, nombre d'interactions et mémoire en JSON."""
+    baseline = process_peak_mb(reset=True)
+    start = time.perf_counter()
+    if method == "pandas":
+        matrix, _, _ = recommender.build_interaction_matrix(pd.read_csv(path))
+    else:
+        matrix, _, _ = recommender.read_interactions(path, chunk_rows=chunk_rows)
+    print(json.dumps({
+        "seconds": time.perf_counter() - start, "nnz": int(matrix.nnz),
+        "baseline_mb": baseline, "peak_mb": process_peak_mb(),
+    }))
+
+
+def run_ingestion(users_df, args):
+    """Compare les méthodes d'ingestion sur les interactions écrites en CSV (et en Parquet)."""
+    with tempfile.TemporaryDirectory(prefix="ingest-") as work_dir:
+        csv_path = os.path.join(work_dir, "users.csv")
+        users_df.to_csv(csv_path, index=False)
+        cases = [("read_csv complet", "pandas", csv_path), ("flux CSV", "stream", csv_path)]
+        try:
+            parquet_path = os.path.join(work_dir, "users.parquet")
+            users_df.to_parquet(parquet_path)
+            cases.append(("flux Parquet", "stream", parquet_path))
+        except ImportError:
+            print("  (pyarrow absent : ingestion Parquet non mesurée)")
+
+        print(f"  {'ingestion':<24}{'durée s':>10}{'pointe Mo':>12}{'dont lecture':>14}")
+        for name, method, path in cases:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--ingest-once", method, path, "--chunk-rows", str(args.chunk_rows)],
+                capture_output=True, text=True, check=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"  {name:<24}{result['seconds']:>10.3f}{result['peak_mb']:>12,.0f}"
+                  f"{result['peak_mb'] - result['baseline_mb']:>14,.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks du moteur de recommandation.")
+    parser.add_argument("--rows", default="1e5,1e6", help="Nombres d'interactions à tester (séparés par des virgules, ex. 1e5,1e6,1e7).")
+    parser.add_argument("--likes-per-user", type=int, default=20)
+    parser.add_argument("--als-iterations", type=int, default=recommender.ALS_ITERATIONS)
+    parser.add_argument("--queries", type=int, default=500, help="Nombre d'utilisateurs interrogés par moteur.")
+    parser.add_argument("--batch-users", type=int, default=10000, help="Nombre d'utilisateurs du mode batch.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--ingest", action="store_true", help="Compare aussi les méthodes d'ingestion d'un fichier d'interactions.")
+    parser.add_argument("--chunk-rows", type=int, default=recommender.INGEST_CHUNK_ROWS, help="Taille des blocs de l'ingestion en flux.")
+    parser.add_argument("--ingest-once", nargs=2, metavar=("METHODE", "FICHIER"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.ingest_once:
+        ingest_once(*args.ingest_once, args.chunk_rows)
+        return
+
+    for num_rows in [int(float(value)) for value in args.rows.split(",")]:
+        run(num_rows, args)
+
+
+if __name__ == "__main__":
+    main()